@@ -1,9 +1,13 @@
 import random
 import os
+from typing import Iterator
 from tqdm import tqdm
 from datasets import load_dataset, Dataset, DatasetDict, concatenate_datasets, Features, Value, Audio
 from Processor.pipeline import Pipeline
+from Loader.sentence_converter import SentenceConverter
+from Loader.streaming_converter import StreamingShardConverter
 from Processor.Domain.supported_language import SupportedLanguage
+from Processor.Domain.precision_mode import PrecisionMode
 import uuid
 import shutil
 import json
@@ -23,25 +27,61 @@ class SampleSimplifier:
 
 sample_simplifier = SampleSimplifier()
 
-def _get_cached_sample_count_by_key(dataset_path: str, key: str) -> int:
-    print(f"Reading metadata from {dataset_path}/meta.json for {key}")
+def _read_metadata(dataset_path: str) -> dict:
     meta_path = os.path.join(dataset_path, "meta.json")
     if os.path.exists(meta_path):
         with open(meta_path, "r") as f:
-            data = json.load(f)
-            return data.get(key, 0)
-    return 0
+            return json.load(f)
+    return {}
 
-def _write_sample_count_for_key(dataset_path: str, count: int, key: str):
-    print(f"Writing metadata in {dataset_path}/meta.json for {key}")
+def _write_metadata(dataset_path: str, values: dict):
+    # None removes the key; the file is replaced atomically so a crash never leaves half of it behind
     meta_path = os.path.join(dataset_path, "meta.json")
-    data = {}
-    if os.path.exists(meta_path):
-        with open(meta_path, "r") as f:
-            data = json.load(f)
-    data[key] = count
-    with open(meta_path, "w") as f:
+    data = _read_metadata(dataset_path)
+    for key, value in values.items():
+        if value is None:
+            data.pop(key, None)
+        else:
+            data[key] = value
+    temp_path = meta_path + "_tmp_" + str(uuid.uuid4())
+    with open(temp_path, "w") as f:
         json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, meta_path)
+
+def _get_cached_sample_count_by_key(dataset_path: str, key: str) -> int:
+    print(f"Reading metadata from {dataset_path}/meta.json for {key}")
+    return _read_metadata(dataset_path).get(key, 0)
+
+def _write_sample_count_for_key(dataset_path: str, count: int, key: str):
+    print(f"Writing metadata in {dataset_path}/meta.json for {key}")
+    _write_metadata(dataset_path, {key: count})
+
+def _stream_state(skip_count: int, state: dict) -> dict:
+    # the state of a stream opened with skip() only loads into a stream opened with the same skip(),
+    # so the count is stored along with it
+    return {"skip_count": skip_count, "state": state}
+
+def _open_stream(language_code: str, stream_state: dict | None, skip_count: int, decode_audio: bool = True):
+    # returns the stream and the number of rows skipped when opening it, which goes into its saved states
+    stream = load_dataset(DatasetUrl, language_code, split="train", streaming=True)
+    if not decode_audio:
+        # samples keep the encoded bytes and the clip path, the saved dataset decodes them on access
+        stream = stream.cast_column("audio", Audio(decode=False))
+    state = None
+    if stream_state is not None and "state" in stream_state:
+        skip_count, state = stream_state["skip_count"], stream_state["state"]
+    elif stream_state is not None:
+        # saved without its skip count: only states taken after skip() have a "skipped" entry
+        skip_count, state = (skip_count if "skipped" in stream_state else 0), stream_state
+    if skip_count > 0:
+        # skipped rows are dropped before their audio is decoded
+        stream = stream.skip(skip_count)
+    if state is not None:
+        # jumps straight to the recorded shard and row
+        stream.load_state_dict(state)
+    return stream, skip_count
 
 class IncrementalSampleSelector:
     @staticmethod
@@ -60,7 +100,13 @@ class IncrementalSampleSelector:
         pipeline: Pipeline,
         required_count: int,
         seed: int = 42,
-        output_dir: str = "preprocessed_datasets"
+        output_dir: str = "preprocessed_datasets",
+        conversion_batch_size: int = 512,
+        workers: int = 1,
+        torch_threads_per_worker: int | None = None,
+        shard_size: int = 1_000,
+        lazy_audio: bool = True,
+        allow_fewer: bool = False
     ) -> Dataset :
         os.makedirs(output_dir, exist_ok=True)
         dataset_path = os.path.join(output_dir, language_code)
@@ -81,32 +127,41 @@ class IncrementalSampleSelector:
             return existing_dataset.select(range(required_count))
 
         print(f"[{language_code}] Need {remaining_count} more samples (have {existing_count}).")
-        rand = random.Random(seed)
-
-        print(f"[{language_code}] Streaming {remaining_count} new samples...")
-    
-        stream = load_dataset(DatasetUrl, language_code, split="train", streaming=True)
-    
-        collected = []
-        skipped = 0
-        for entry in tqdm(stream, desc=f"Filtering {language_code}"):
-            if skipped < existing_count:
-                skipped += 1
-                continue
-            sample = sample_simplifier(entry)
-            if sample is not None:
-                collected.append(sample)
-                if len(collected) >= remaining_count:
-                    break
-
-        rand.shuffle(collected)
 
-        print(f"[{language_code}] Phonetically converting {len(collected)} samples...")
-        for sample in tqdm(collected, desc=f"Converting {language_code}"):
-            sample["sentence"] = pipeline(sample["sentence"])
-
-        new_dataset = Dataset.from_list(collected, features=SampleInterface)
-        combined_dataset = concatenate_datasets([existing_dataset, new_dataset])
+        shards_path = os.path.join(output_dir, f"{language_code}_shards")
+        progress_key = f"{language_code}_progress"
+        expected_progress = {"existing_count": existing_count, "seed": seed, "shard_size": shard_size}
+        stream_state_key = f"{language_code}_stream_state"
+        metadata = _read_metadata(output_dir)
+        progress = metadata.get(progress_key)
+        if progress is None or any(progress.get(key) != value for key, value in expected_progress.items()):
+            shutil.rmtree(shards_path, ignore_errors=True)
+            progress = {**expected_progress,
+                        "completed_shards": 0,
+                        "converted_count": 0,
+                        "stream_position": 0,
+                        "stream_state": metadata.get(stream_state_key) if existing_count > 0 else None}
+        else:
+            print(f"[{language_code}] Resuming after {progress['completed_shards']} converted shards "
+                  f"({progress['converted_count']} samples).")
+        os.makedirs(shards_path, exist_ok=True)
+
+        if progress["converted_count"] < remaining_count:
+            with SentenceConverter(pipeline,
+                                   batch_size=conversion_batch_size,
+                                   workers=workers,
+                                   torch_threads_per_worker=torch_threads_per_worker) as converter:
+                IncrementalSampleSelector._convert_in_shards(
+                    language_code, converter, remaining_count, progress, shards_path, output_dir, lazy_audio)
+            # with worker processes the lookups happen in their own caches, not in this one
+            if pipeline.is_cache_open():
+                print(f"[{language_code}] {pipeline.cache}")
+
+        shards = [Dataset.load_from_disk(IncrementalSampleSelector._shard_path(shards_path, i))
+                  for i in range(progress["completed_shards"])]
+        # the saved dataset may already contain the shards if we crashed right after saving it,
+        # so only the first existing_count rows are trusted
+        combined_dataset = concatenate_datasets([existing_dataset.select(range(existing_count)), *shards])
 
         print(f"[{language_code}] Saving updated dataset with {len(combined_dataset)} total samples...")
         try:
@@ -115,38 +170,111 @@ class IncrementalSampleSelector:
             print(f"[{language_code}] Permission error during save. Using fallback strategy.")
             IncrementalSampleSelector.force_write_dataset_to_disk(combined_dataset, dataset_path)
 
-        _write_sample_count_for_key(output_dir, len(combined_dataset), language_code)
+        print(f"Writing metadata in {output_dir}/meta.json for {language_code}")
+        _write_metadata(output_dir, {
+            language_code: len(combined_dataset),
+            stream_state_key: progress["stream_state"],
+            progress_key: None
+        })
+        shutil.rmtree(shards_path, ignore_errors=True)
 
-        return combined_dataset.select(range(required_count))
+        saved_dataset = Dataset.load_from_disk(dataset_path)
+        # a too short stream is reported by the caller when allow_fewer is set
+        return saved_dataset.select(range(min(required_count, len(saved_dataset)) if allow_fewer else required_count))
+
+    @staticmethod
+    def _shard_path(shards_path: str, index: int) -> str:
+        return os.path.join(shards_path, f"shard_{index:05d}")
+
+    @staticmethod
+    def _convert_in_shards(
+        language_code: str,
+        converter: SentenceConverter,
+        remaining_count: int,
+        progress: dict,
+        shards_path: str,
+        output_dir: str,
+        lazy_audio: bool
+    ):
+        print(f"[{language_code}] Streaming {remaining_count - progress['converted_count']} new samples...")
+
+        stream, skip_count = _open_stream(language_code,
+                                          progress["stream_state"],
+                                          progress["existing_count"] + progress["stream_position"],
+                                          decode_audio=not lazy_audio)
+
+        def write_shard(samples: list[dict], converted: list[str], stream_position: int, stream_state: dict):
+            shard_index = progress["completed_shards"]
+            # the audio column is attached back by position, only the sentences went through the pipeline.
+            # The shard only becomes visible once it is completely written
+            shard_path = IncrementalSampleSelector._shard_path(shards_path, shard_index)
+            temp_path = shard_path + "_tmp_" + str(uuid.uuid4())
+            Dataset.from_dict({"audio": [sample["audio"] for sample in samples], "sentence": converted},
+                              features=SampleInterface).save_to_disk(temp_path)
+            shutil.rmtree(shard_path, ignore_errors=True)
+            os.replace(temp_path, shard_path)
+
+            progress["completed_shards"] = shard_index + 1
+            progress["converted_count"] += len(samples)
+            progress["stream_position"] = stream_position
+            progress["stream_state"] = _stream_state(skip_count, stream_state)
+            _write_metadata(output_dir, {f"{language_code}_progress": progress})
+            print(f"\n[{language_code}] Wrote shard {shard_index} ({progress['converted_count']}/{remaining_count} samples)")
+
+        streaming = StreamingShardConverter(converter, shard_size=progress["shard_size"], batch_size=converter.batch_size)
+        streaming.run(
+            stream,
+            sample_simplifier,
+            desc=f"Filtering {language_code}",
+            start_position=progress["stream_position"],
+            first_shard=progress["completed_shards"],
+            seed=progress["seed"],
+            missing_count=remaining_count - progress["converted_count"],
+            on_shard=write_shard
+        )
+        print(f"[{language_code}] Converted {streaming.distinct_count} distinct sentences "
+              f"for {streaming.sample_count} samples ({streaming.dedup_ratio():.1%} deduplicated)")
 
 
 class Loader:
-    def __init__(self, it_fraction: float, es_fraction: float, seed: int = 42):
+    def __init__(self,
+                 it_fraction: float = 0.0,
+                 es_fraction: float = 0.0,
+                 seed: int = 42,
+                 cache_dir: str | None = os.path.join("preprocessed_datasets", "transliteration_cache"),
+                 workers: int = 1,
+                 torch_threads_per_worker: int | None = None,
+                 lazy_audio: bool = True,
+                 precision: PrecisionMode = PrecisionMode.Float32):
         assert 0 <= it_fraction <= 1
         assert 0 <= es_fraction <= 1
         self.italian_fraction = it_fraction
         self.spanish_fraction = es_fraction
-        self.italian_pipeline = Pipeline(SupportedLanguage.Italian)
-        self.spanish_pipeline = Pipeline(SupportedLanguage.Spanish)
+        self.workers = workers
+        self.torch_threads_per_worker = torch_threads_per_worker
+        self.lazy_audio = lazy_audio
+        self.italian_pipeline = Pipeline(SupportedLanguage.Italian, cache_dir=cache_dir, precision=precision)
+        self.spanish_pipeline = Pipeline(SupportedLanguage.Spanish, cache_dir=cache_dir, precision=precision)
         self.random = random.Random(seed)
 
     @staticmethod
-    def _load_romanian_data(count: int, output_dir: str = "preprocessed_datasets") -> list:
+    def _load_romanian_data(count: int, output_dir: str = "preprocessed_datasets", lazy_audio: bool = True) -> Dataset:
         dataset_path = os.path.join(output_dir, "ro")
         os.makedirs(output_dir, exist_ok=True)
 
         existing_count = 0
-        collected = []
+        stream_state = None
+        existing_dataset = Dataset.from_dict({"audio": [], "sentence": []}, features=SampleInterface)
 
         if os.path.exists(dataset_path):
             print("[ro] Loading cached Romanian samples from disk...")
             existing_dataset = Dataset.load_from_disk(dataset_path)
             existing_count = _get_cached_sample_count_by_key(output_dir, "ro")
-            collected = existing_dataset.to_list()
+            stream_state = _read_metadata(output_dir).get("ro_stream_state")
 
             if existing_count >= count:
                 print(f"[ro] Already have {existing_count} samples.")
-                return collected[:count]
+                return existing_dataset.select(range(count))
 
             print(f"[ro] Found {existing_count}, need {count}. Fetching {count - existing_count} more...")
 
@@ -154,50 +282,62 @@ class Loader:
             print("[ro] No cached Romanian dataset found. Starting fresh.")
 
         print(f"[ro] Streaming {count - existing_count} new samples...")
-        stream = load_dataset(DatasetUrl, "ro", split="train", streaming=True)
+        stream, skip_count = _open_stream("ro", stream_state, existing_count, decode_audio=not lazy_audio)
 
-        skipped = 0
+        collected = []
         for entry in tqdm(stream, desc="Collecting Romanian samples"):
-            if skipped < existing_count:
-                skipped += 1
-                continue
             simplified = sample_simplifier(entry)
             if simplified is not None:
                 collected.append(simplified)
-                if len(collected) >= count:
+                if existing_count + len(collected) >= count:
                     break
 
-        print(f"[ro] Saving Romanian dataset with {len(collected)} samples to disk...")
-        Dataset.from_list(collected, features=SampleInterface).save_to_disk(dataset_path)
-        _write_sample_count_for_key(output_dir, len(collected), "ro")
+        combined_dataset = concatenate_datasets([
+            existing_dataset.select(range(existing_count)),
+            Dataset.from_list(collected, features=SampleInterface)
+        ])
+        print(f"[ro] Saving Romanian dataset with {len(combined_dataset)} samples to disk...")
+        try:
+            combined_dataset.save_to_disk(dataset_path)
+        except PermissionError:
+            print("[ro] Permission error during save. Using fallback strategy.")
+            IncrementalSampleSelector.force_write_dataset_to_disk(combined_dataset, dataset_path)
+        print(f"Writing metadata in {output_dir}/meta.json for ro")
+        _write_metadata(output_dir, {"ro": len(combined_dataset),
+                                     "ro_stream_state": _stream_state(skip_count, stream.state_dict())})
 
-        return collected[:count]
+        saved_dataset = Dataset.load_from_disk(dataset_path)
+        return saved_dataset.select(range(min(count, len(saved_dataset))))
 
     @staticmethod
-    def _split_romanian_data(data: list) -> tuple[Dataset, Dataset, Dataset]:
+    def _split_romanian_data(data: Dataset) -> tuple[Dataset, Dataset, Dataset]:
         val_size = int(0.1 * len(data))
         test_size = int(0.1 * len(data))
 
-        validation_set = data[:val_size]
-        test_set = data[val_size:val_size + test_size]
-        training_set = data[val_size + test_size:]
+        # index views over the same Arrow table, no rows are copied
+        validation_set = data.select(range(val_size))
+        test_set = data.select(range(val_size, val_size + test_size))
+        training_set = data.select(range(val_size + test_size, len(data)))
 
-        return Dataset.from_list(training_set, features=SampleInterface), \
-               Dataset.from_list(validation_set, features=SampleInterface), \
-               Dataset.from_list(test_set, features=SampleInterface)
+        return training_set, validation_set, test_set
 
 
-    def _load_augmented_data(self, train_size: int, output_dir: str = "preprocessed_datasets") -> Dataset:
-        it_count = int(self.italian_fraction * train_size)
-        es_count = int(self.spanish_fraction * train_size)
-
+    def _load_augmented_pools(self,
+                              it_count: int,
+                              es_count: int,
+                              output_dir: str = "preprocessed_datasets",
+                              allow_fewer: bool = False) -> tuple[Dataset, Dataset]:
         print("Loading Italian data...")
         italian_data = IncrementalSampleSelector.select(
             "it",
             self.italian_pipeline,
             it_count,
             seed=self.random.randint(0, 10_000),
-            output_dir=output_dir
+            output_dir=output_dir,
+            workers=self.workers,
+            torch_threads_per_worker=self.torch_threads_per_worker,
+            lazy_audio=self.lazy_audio,
+            allow_fewer=allow_fewer
         )
 
         print("Loading Spanish data...")
@@ -206,22 +346,33 @@ class Loader:
             self.spanish_pipeline,
             es_count,
             seed=self.random.randint(0, 10_000),
-            output_dir=output_dir
+            output_dir=output_dir,
+            workers=self.workers,
+            torch_threads_per_worker=self.torch_threads_per_worker,
+            lazy_audio=self.lazy_audio,
+            allow_fewer=allow_fewer
         )
 
+        return italian_data, spanish_data
+
+    def _load_augmented_data(self, train_size: int, output_dir: str = "preprocessed_datasets") -> Dataset:
+        it_count = int(self.italian_fraction * train_size)
+        es_count = int(self.spanish_fraction * train_size)
+        italian_data, spanish_data = self._load_augmented_pools(it_count, es_count, output_dir=output_dir)
         return concatenate_datasets([italian_data, spanish_data])
 
     @staticmethod
-    def _build_dataset(train, val, test) -> DatasetDict:
+    def _build_dataset(train: Dataset, val: Dataset, test: Dataset) -> DatasetDict:
         print("Running some sanity checks...")
-        assert all(sample is not None for sample in train), "Training set contains None samples!"
-        assert all(sample is not None for sample in val), "Validation set contains None samples!"
-        assert all(sample is not None for sample in test), "Test set contains None samples!"
+        # only the sentence column is read, so no audio is decoded for the checks
+        assert None not in train["sentence"], "Training set contains None samples!"
+        assert None not in val["sentence"], "Validation set contains None samples!"
+        assert None not in test["sentence"], "Test set contains None samples!"
 
         dataset = DatasetDict({
-            "train": Dataset.from_list(train, features=SampleInterface),
-            "val": Dataset.from_list(val, features=SampleInterface),
-            "test": Dataset.from_list(test, features=SampleInterface),
+            "train": train,
+            "val": val,
+            "test": test,
         })
 
         total_size = sum(len(dataset[split]) for split in dataset)
@@ -230,13 +381,43 @@ class Loader:
         print(f"Final sizes — Train: {len(dataset['train'])}, Val: {len(dataset['val'])}, Test: {len(dataset['test'])}")
         return dataset
 
-    def load(self, romanian_sample_count: int = 10_000, output_dir: str="preprocessed_datasets") -> Dataset:
-        romanian_data = self._load_romanian_data(romanian_sample_count)
+    def load(self, romanian_sample_count: int = 10_000, output_dir: str="preprocessed_datasets") -> DatasetDict:
+        romanian_data = self._load_romanian_data(romanian_sample_count, output_dir=output_dir, lazy_audio=self.lazy_audio)
+        romanian_training_split, validation_split, testing_split = self._split_romanian_data(romanian_data)
+        augmented_data = self._load_augmented_data(len(romanian_training_split), output_dir=output_dir)
+        train = concatenate_datasets([romanian_training_split, augmented_data])
+
+        return self._build_dataset(train, validation_split, testing_split)
+
+    def load_many(self,
+                  fractions: list[tuple[float, float]],
+                  romanian_sample_count: int = 10_000,
+                  output_dir: str = "preprocessed_datasets") -> Iterator[tuple[tuple[float, float], DatasetDict]]:
+        # the Romanian data and the largest Italian/Spanish requirement are loaded (and converted) once,
+        # every split is then a set of index views over these pools.
+        # A split needing more samples than the streams could provide raises IndexError when it is reached
+        for it_fraction, es_fraction in fractions:
+            assert 0 <= it_fraction <= 1
+            assert 0 <= es_fraction <= 1
+
+        romanian_data = self._load_romanian_data(romanian_sample_count, output_dir=output_dir, lazy_audio=self.lazy_audio)
         romanian_training_split, validation_split, testing_split = self._split_romanian_data(romanian_data)
-        augmented_data = self._load_augmented_data(len(romanian_training_split), output_dir=output_dir).to_list()
-        train = concatenate_datasets([romanian_training_split, augmented_data]).to_list()
+        train_size = len(romanian_training_split)
+
+        italian_pool, spanish_pool = self._load_augmented_pools(
+            max((int(it_fraction * train_size) for it_fraction, _ in fractions), default=0),
+            max((int(es_fraction * train_size) for _, es_fraction in fractions), default=0),
+            output_dir=output_dir,
+            allow_fewer=True
+        )
 
-        return Dataset.from_dict(self._build_dataset(train, validation_split, testing_split))
+        for it_fraction, es_fraction in fractions:
+            augmented_data = concatenate_datasets([
+                italian_pool.select(range(int(it_fraction * train_size))),
+                spanish_pool.select(range(int(es_fraction * train_size)))
+            ])
+            train = concatenate_datasets([romanian_training_split, augmented_data])
+            yield (it_fraction, es_fraction), self._build_dataset(train, validation_split, testing_split)
 
     @staticmethod
     def cleanup(dir_name: str):
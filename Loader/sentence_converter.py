@@ -0,0 +1,102 @@
+import multiprocessing
+import os
+from typing import Callable
+
+import torch
+from tqdm import tqdm
+
+from expose_deep_phonemizer_module import expose_dp
+from Processor.Domain.precision_mode import PrecisionMode
+from Processor.Domain.supported_language import SupportedLanguage
+from Processor.pipeline import Pipeline
+
+# each worker process builds its own pipeline once, in _init_worker
+_worker_pipeline: Pipeline | None = None
+
+
+def _init_worker(lang: SupportedLanguage, cache_dir: str | None, precision: PrecisionMode, torch_threads: int):
+    global _worker_pipeline
+    torch.set_num_threads(torch_threads)
+    expose_dp()
+    _worker_pipeline = Pipeline(lang, cache_dir=cache_dir, precision=precision)
+    # models load lazily, so load them here for a broken checkpoint to fail the pool start, not a shard
+    _worker_pipeline.warmup()
+
+
+def _convert_shard(sentences: list[str]) -> list[str]:
+    return _worker_pipeline.batch(sentences)
+
+
+class SentenceConverter:
+    def __init__(self,
+                 pipeline: Pipeline,
+                 batch_size: int = 512,
+                 workers: int = 1,
+                 torch_threads_per_worker: int | None = None):
+        assert batch_size > 0
+        assert workers > 0
+        self.pipeline = pipeline
+        self.batch_size = batch_size
+        self.workers = workers
+        # split the cores between the workers instead of letting every one of them use all of them
+        self.torch_threads_per_worker = torch_threads_per_worker \
+            if torch_threads_per_worker is not None \
+            else max(1, (os.cpu_count() or 1) // workers)
+        self._pool = None
+
+    def __get_pool(self):
+        # started on first use and kept alive across calls, since every worker pays for loading the models
+        if self._pool is None:
+            # spawn, since forking a process that already runs torch threads can deadlock
+            context = multiprocessing.get_context("spawn")
+            self._pool = context.Pool(processes=self.workers,
+                                      initializer=_init_worker,
+                                      initargs=(self.pipeline.lang,
+                                                self.pipeline.cache_dir,
+                                                self.pipeline.precision,
+                                                self.torch_threads_per_worker))
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self) -> "SentenceConverter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None and self._pool is not None:
+            self._pool.terminate()
+        self.close()
+
+    def __shards(self, sentences: list[str]) -> list[list[str]]:
+        return [sentences[start:start + self.batch_size] for start in range(0, len(sentences), self.batch_size)]
+
+    def tokenize(self, sentences: list[str]) -> list:
+        # in-process conversion can tokenize ahead of the models, worker processes tokenize on their own
+        return self.pipeline.tokenize_batch(sentences) if self.workers == 1 else sentences
+
+    def submit_tokenized(self, tokenized: list) -> Callable[[], list[str]]:
+        # starts converting the output of tokenize and returns a function waiting for the result,
+        # so that callers can keep one batch per worker in flight
+        if self.workers == 1:
+            converted = self.pipeline.convert_docs(tokenized)
+            return lambda: converted
+        pending = self.__get_pool().map_async(_convert_shard, self.__shards(tokenized))
+        return lambda: [sentence for result in pending.get() for sentence in result]
+
+    def __call__(self, sentences: list[str], desc: str = "Converting", show_progress: bool = True) -> list[str]:
+        shards = self.__shards(sentences)
+        converted = []
+        with tqdm(total=len(sentences), desc=desc, disable=not show_progress) as progress:
+            if self.workers == 1:
+                for shard in shards:
+                    converted.extend(self.pipeline.batch(shard))
+                    progress.update(len(shard))
+            else:
+                for shard, result in zip(shards, self.__get_pool().imap(_convert_shard, shards)):
+                    converted.extend(result)
+                    progress.update(len(shard))
+        return converted
@@ -0,0 +1,71 @@
+import sys
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+from Loader.streaming_converter import StreamingShardConverter
+
+
+class _SlowConverter:
+    # stands in for SentenceConverter: every batch takes a while in one of the workers,
+    # which record how many of them are busy at the same time
+    def __init__(self, workers: int, delay: float):
+        self.workers = workers
+        self.delay = delay
+        self.busy = 0
+        self.max_busy = 0
+        self.lock = threading.Lock()
+        self.pool = ThreadPool(workers)
+
+    def __convert(self, sentences: list[str]) -> list[str]:
+        with self.lock:
+            self.busy += 1
+            self.max_busy = max(self.max_busy, self.busy)
+        time.sleep(self.delay)
+        with self.lock:
+            self.busy -= 1
+        return [sentence.upper() for sentence in sentences]
+
+    def tokenize(self, sentences: list[str]) -> list[str]:
+        return sentences
+
+    def submit_tokenized(self, tokenized: list[str]):
+        pending = self.pool.apply_async(self.__convert, (tokenized,))
+        return pending.get
+
+
+class _Stream(list):
+    def state_dict(self) -> dict:
+        return {}
+
+
+if __name__ == "__main__":
+    # Checks that the streaming converter keeps every worker busy instead of waiting for each batch,
+    # and that the converted sentences still line up with their samples. Exits with 1 otherwise.
+    workers, batch_size = 4, 8
+    converter = _SlowConverter(workers, delay=0.05)
+    stream = _Stream({"sentence": f"sentence {i % 97}"} for i in range(1_000))
+    written = []
+    streaming = StreamingShardConverter(converter, shard_size=100, batch_size=batch_size, dedup_window=batch_size)
+    streaming.run(stream,
+                  lambda entry: entry,
+                  desc="Checking",
+                  start_position=0,
+                  first_shard=0,
+                  seed=0,
+                  missing_count=len(stream),
+                  on_shard=lambda samples, sentences, position, state: written.extend(zip(samples, sentences)))
+    converter.pool.close()
+
+    failures = []
+    if converter.max_busy < 2:
+        failures.append(f"at most {converter.max_busy} of {workers} workers were busy at once")
+    if len(written) != len(stream):
+        failures.append(f"wrote {len(written)} of {len(stream)} samples")
+    if any(sample["sentence"].upper() != sentence for sample, sentence in written):
+        failures.append("converted sentences do not match their samples")
+
+    print(f"Up to {converter.max_busy} of {workers} workers were busy at once.")
+    for failure in failures:
+        print(failure)
+    sys.exit(0 if len(failures) == 0 else 1)
@@ -0,0 +1,244 @@
+import queue
+import random
+import threading
+import unicodedata
+from collections import OrderedDict, deque
+from typing import Callable, Iterable
+
+from tqdm import tqdm
+
+from Loader.sentence_converter import SentenceConverter
+
+# marks the end of a stage's output
+_Done = object()
+
+
+def normalize_sentence(sentence: str) -> str:
+    # Common Voice prompts recorded by many speakers differ at most in unicode form and spacing
+    return " ".join(unicodedata.normalize("NFC", sentence).split())
+
+
+class ShuffleBuffer:
+    # seeded streaming shuffle: every new item evicts a random held one
+    def __init__(self, size: int, seed: int):
+        assert size > 0
+        self.size = size
+        self.random = random.Random(seed)
+        self.items = []
+
+    def push(self, item) -> list:
+        if len(self.items) < self.size:
+            self.items.append(item)
+            return []
+        index = self.random.randrange(self.size)
+        evicted, self.items[index] = self.items[index], item
+        return [evicted]
+
+    def drain(self) -> list:
+        items, self.items = self.items, []
+        self.random.shuffle(items)
+        return items
+
+
+def _keep_recent(entries: OrderedDict, keys: list[str], size: int):
+    # the tokenize and convert stages call this with the same keys in the same order,
+    # so both of them forget the same sentences
+    for key in keys:
+        entries.move_to_end(key)
+    while len(entries) > size:
+        entries.popitem(last=False)
+
+
+class _ShardBoundary:
+    def __init__(self, stream_position: int, stream_state: dict):
+        self.stream_position = stream_position
+        self.stream_state = stream_state
+
+
+# Runs download/decode, tokenization, G2P/P2G conversion and shard writing as concurrent stages
+# connected by bounded queues, so a slow stage blocks the ones feeding it instead of letting samples
+# pile up in memory. Samples are shuffled per shard through a seeded shuffle buffer and every shard
+# ends on a known stream position, so a run can resume after the last written shard.
+# Each distinct (normalized) sentence among the dedup_window most recently seen ones is tokenized and
+# converted once, repeats reuse that result. Older sentences are forgotten to bound memory, the
+# transliteration cache still spares their words the model work.
+class StreamingShardConverter:
+    def __init__(self,
+                 converter: SentenceConverter,
+                 shard_size: int,
+                 batch_size: int = 512,
+                 shuffle_buffer_size: int = 256,
+                 queue_size: int = 4,
+                 dedup_window: int = 100_000):
+        assert shard_size > 0
+        assert batch_size > 0
+        # every sentence of the batch being converted must still be remembered
+        assert dedup_window >= batch_size
+        self.converter = converter
+        self.shard_size = shard_size
+        self.batch_size = batch_size
+        self.shuffle_buffer_size = shuffle_buffer_size
+        self.queue_size = queue_size
+        self.dedup_window = dedup_window
+        self.sample_count = 0
+        self.distinct_count = 0
+
+    @staticmethod
+    def __put(target: queue.Queue, item, stop: threading.Event):
+        while not stop.is_set():
+            try:
+                target.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    @staticmethod
+    def __get(source: queue.Queue, stop: threading.Event):
+        while not stop.is_set():
+            try:
+                return source.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        return _Done
+
+    def __read(self, stream, simplify: Callable[[dict], dict | None], desc: str, start_position: int,
+               first_shard: int, seed: int, missing_count: int, output: queue.Queue, stop: threading.Event):
+        position, shard, taken = start_position, first_shard, 0
+        buffer = ShuffleBuffer(self.shuffle_buffer_size, seed + shard)
+        pending = []
+
+        def emit(samples: list):
+            pending.extend(samples)
+            while len(pending) >= self.batch_size:
+                self.__put(output, pending[:self.batch_size], stop)
+                del pending[:self.batch_size]
+
+        def end_shard():
+            emit(buffer.drain())
+            if len(pending) > 0:
+                self.__put(output, pending.copy(), stop)
+                pending.clear()
+            self.__put(output, _ShardBoundary(position, stream.state_dict()), stop)
+
+        for entry in tqdm(stream, desc=desc):
+            if stop.is_set():
+                return
+            position += 1
+            sample = simplify(entry)
+            if sample is None:
+                continue
+            emit(buffer.push(sample))
+            taken += 1
+            if taken >= min(self.shard_size, missing_count):
+                end_shard()
+                missing_count -= taken
+                shard, taken = shard + 1, 0
+                buffer = ShuffleBuffer(self.shuffle_buffer_size, seed + shard)
+                if missing_count <= 0:
+                    break
+        if taken > 0:
+            end_shard()
+
+    def __tokenize(self, source: queue.Queue, output: queue.Queue, stop: threading.Event):
+        sent = OrderedDict()
+        while (item := self.__get(source, stop)) is not _Done:
+            if isinstance(item, _ShardBoundary):
+                self.__put(output, item, stop)
+                continue
+            keys = [normalize_sentence(sample["sentence"]) for sample in item]
+            # only sentences not sent down recently are tokenized, the convert stage receives
+            # the batches in order and forgets the same ones, so it still holds the result of every other one
+            new = {}
+            for key, sample in zip(keys, item):
+                if key not in sent and key not in new:
+                    new[key] = sample["sentence"]
+            sent.update(dict.fromkeys(new))
+            _keep_recent(sent, keys, self.dedup_window)
+            self.sample_count += len(item)
+            self.distinct_count += len(new)
+            self.__put(output, (item, keys, list(new.keys()), self.converter.tokenize(list(new.values()))), stop)
+
+    def __convert(self, source: queue.Queue, output: queue.Queue, stop: threading.Event):
+        converted_by_key = OrderedDict()
+        # one batch per worker is converted at a time. Batches and shard boundaries are sent down in the
+        # order they came in, so a batch reusing the sentences of an earlier one finds them converted
+        in_flight = deque()
+
+        def finish_oldest():
+            entry = in_flight.popleft()
+            if isinstance(entry, _ShardBoundary):
+                self.__put(output, entry, stop)
+                return
+            samples, keys, new_keys, result = entry
+            converted_by_key.update(zip(new_keys, result()))
+            converted = [converted_by_key[key] for key in keys]
+            _keep_recent(converted_by_key, keys, self.dedup_window)
+            self.__put(output, (samples, converted), stop)
+
+        while (item := self.__get(source, stop)) is not _Done:
+            if isinstance(item, _ShardBoundary):
+                in_flight.append(item)
+                continue
+            samples, keys, new_keys, tokenized = item
+            in_flight.append((samples, keys, new_keys, self.converter.submit_tokenized(tokenized)))
+            while sum(not isinstance(entry, _ShardBoundary) for entry in in_flight) >= self.converter.workers:
+                finish_oldest()
+        while len(in_flight) > 0 and not stop.is_set():
+            finish_oldest()
+
+    def dedup_ratio(self) -> float:
+        # share of the samples of the last run whose sentence did not have to be converted
+        return 1 - self.distinct_count / self.sample_count if self.sample_count > 0 else 0.0
+
+    def run(self,
+            stream: Iterable[dict],
+            simplify: Callable[[dict], dict | None],
+            desc: str,
+            start_position: int,
+            first_shard: int,
+            seed: int,
+            missing_count: int,
+            on_shard: Callable[[list[dict], list[str], int, dict], None]):
+        # on_shard(samples, converted sentences, stream position, stream state) runs in the calling thread
+        stop = threading.Event()
+        errors = []
+        self.sample_count, self.distinct_count = 0, 0
+        raw, tokenized, converted = (queue.Queue(maxsize=self.queue_size) for _ in range(3))
+
+        def stage(target, *args):
+            def run_stage():
+                try:
+                    target(*args)
+                except BaseException as e:
+                    errors.append(e)
+                    stop.set()
+                finally:
+                    self.__put(args[-2], _Done, stop)
+            return threading.Thread(target=run_stage, daemon=True)
+
+        threads = [
+            stage(self.__read, stream, simplify, desc, start_position, first_shard, seed, missing_count, raw, stop),
+            stage(self.__tokenize, raw, tokenized, stop),
+            stage(self.__convert, tokenized, converted, stop),
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            samples, sentences = [], []
+            while (item := self.__get(converted, stop)) is not _Done:
+                if isinstance(item, _ShardBoundary):
+                    on_shard(samples, sentences, item.stream_position, item.stream_state)
+                    samples, sentences = [], []
+                else:
+                    samples.extend(item[0])
+                    sentences.extend(item[1])
+        except BaseException:
+            stop.set()
+            raise
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        if len(errors) > 0:
+            raise errors[0]
@@ -0,0 +1,95 @@
+import os
+import shutil
+import time
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from datasets import DatasetDict
+from tqdm import tqdm
+
+
+class UploadTarget(ABC):
+    @abstractmethod
+    def upload(self, dataset: DatasetDict, name: str):
+        pass
+
+
+class HubTarget(UploadTarget):
+    def __init__(self, namespace: str, private: bool = False):
+        self.namespace = namespace
+        self.private = private
+
+    def upload(self, dataset: DatasetDict, name: str):
+        dataset.push_to_hub(f"{self.namespace}/{name}", private=self.private)
+
+    def __str__(self):
+        return f"https://huggingface.co/datasets/{self.namespace}"
+
+
+class LocalDirectoryTarget(UploadTarget):
+    # stand-in for the Hub, e.g. for dry runs and tests
+    def __init__(self, root: str):
+        self.root = root
+
+    def upload(self, dataset: DatasetDict, name: str):
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, name)
+        temp_path = path + "_tmp_" + str(uuid.uuid4())
+        dataset.save_to_disk(temp_path)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(temp_path, path)
+
+    def __str__(self):
+        return self.root
+
+
+class Uploader:
+    def __init__(self,
+                 target: UploadTarget,
+                 workers: int = 4,
+                 retries: int = 3,
+                 backoff_seconds: float = 5.0):
+        assert workers > 0
+        assert retries >= 0
+        self.target = target
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="uploader")
+        self._uploads: dict[str, Future] = {}
+
+    def __upload_with_retries(self, dataset: DatasetDict, name: str):
+        for attempt in range(self.retries + 1):
+            try:
+                self.target.upload(dataset, name)
+                print(f"\nUploaded {name} to {self.target}")
+                return
+            except Exception as e:
+                if attempt == self.retries:
+                    raise e
+                delay = self.backoff_seconds * 2 ** attempt
+                print(f"\nUploading {name} failed ({e}), retrying in {delay:.0f}s...")
+                time.sleep(delay)
+
+    def submit(self, dataset: DatasetDict, name: str) -> Future:
+        # returns immediately, so that the next dataset can be built while this one uploads
+        upload = self._executor.submit(self.__upload_with_retries, dataset, name)
+        self._uploads[name] = upload
+        return upload
+
+    def wait(self) -> dict[str, Exception]:
+        failures = {}
+        for name, upload in tqdm(self._uploads.items(), desc="Waiting for uploads"):
+            exception = upload.exception()
+            if exception is not None:
+                failures[name] = exception
+        return failures
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self) -> "Uploader":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
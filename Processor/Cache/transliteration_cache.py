@@ -0,0 +1,141 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from Processor.Domain.supported_language import SupportedLanguage
+
+# (path, size, mtime) -> sha256, so that every Pipeline of a process
+# does not re-read the multi-hundred MB checkpoints just to hash them
+_file_digests = {}
+
+
+def _file_digest(path: str) -> str:
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _file_digests:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        _file_digests[key] = digest.hexdigest()
+    return _file_digests[key]
+
+
+def fingerprint_models(paths: list[str]) -> str:
+    # files are named relative to the model path they belong to, not to the working directory,
+    # so running from another directory does not invalidate the cache
+    files = []
+    for path in paths:
+        name = os.path.basename(os.path.normpath(path))
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend((os.path.join(name, os.path.relpath(os.path.join(root, file), path)),
+                              os.path.join(root, file))
+                             for file in names)
+        else:
+            files.append((name, path))
+    digest = hashlib.sha256()
+    for name, file in sorted(files):
+        digest.update(name.replace(os.sep, "/").encode())
+        digest.update(_file_digest(file).encode())
+    return digest.hexdigest()
+
+
+class TransliterationCache:
+    # sqlite refuses statements with too many bound parameters
+    __LookupChunk = 500
+
+    def __init__(self,
+                 lang: SupportedLanguage,
+                 model_paths: list[str],
+                 cache_dir: str,
+                 memory_size: int = 100_000,
+                 model_variant: str = "fp32"):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.lang = lang
+        self.model_hash = fingerprint_models(model_paths)
+        # the same models run with other settings (e.g. reduced precision) may disagree with fp32,
+        # so their results are kept apart in the same file instead of replacing each other
+        self.model_variant = model_variant
+        self.memory_size = memory_size
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(os.path.join(cache_dir, f"{lang}.sqlite"),
+                                           timeout=60,
+                                           check_same_thread=False)
+        with self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            columns = [row[1] for row in self._connection.execute("PRAGMA table_info(transliterations)")]
+            if len(columns) > 0 and "model_variant" not in columns:
+                # written before variants existed, those entries are recomputed
+                self._connection.execute("DROP TABLE transliterations")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS transliterations ("
+                "language TEXT NOT NULL, "
+                "model_hash TEXT NOT NULL, "
+                "model_variant TEXT NOT NULL, "
+                "word TEXT NOT NULL, "
+                "grapheme TEXT NOT NULL, "
+                "PRIMARY KEY (language, model_hash, model_variant, word)"
+                ") WITHOUT ROWID")
+            # entries produced by a previous version of the models are never valid again,
+            # entries of the other variants of the current models are
+            self._connection.execute(
+                "DELETE FROM transliterations WHERE language = ? AND model_hash != ?",
+                (str(lang), self.model_hash))
+
+    def _remember(self, word: str, grapheme: str):
+        self._memory[word] = grapheme
+        self._memory.move_to_end(word)
+        if len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get_many(self, words: list[str]) -> dict[str, str]:
+        found = {}
+        with self._lock:
+            on_disk = []
+            for word in dict.fromkeys(words):
+                if word in self._memory:
+                    self._memory.move_to_end(word)
+                    found[word] = self._memory[word]
+                else:
+                    on_disk.append(word)
+            for start in range(0, len(on_disk), self.__LookupChunk):
+                chunk = on_disk[start:start + self.__LookupChunk]
+                rows = self._connection.execute(
+                    "SELECT word, grapheme FROM transliterations "
+                    "WHERE language = ? AND model_hash = ? AND model_variant = ? "
+                    f"AND word IN ({','.join('?' * len(chunk))})",
+                    (str(self.lang), self.model_hash, self.model_variant, *chunk)).fetchall()
+                for word, grapheme in rows:
+                    self._remember(word, grapheme)
+                    found[word] = grapheme
+            self.hits += sum(1 for word in words if word in found)
+            self.misses += sum(1 for word in words if word not in found)
+        return found
+
+    def put_many(self, graphemes: dict[str, str]):
+        with self._lock:
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO transliterations VALUES (?, ?, ?, ?, ?)",
+                    [(str(self.lang), self.model_hash, self.model_variant, word, grapheme)
+                     for word, grapheme in graphemes.items()])
+            for word, grapheme in graphemes.items():
+                self._remember(word, grapheme)
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def __str__(self):
+        return f"Transliteration cache for {self.lang}: {self.hits} hits, " \
+               f"{self.misses} misses ({self.hit_rate():.1%} hit rate)"
@@ -0,0 +1,51 @@
+import argparse
+import time
+
+from Processor.DeepGraphemizer.phoneme2grapheme_converter import Phoneme2GraphemeConverter
+from Processor.Domain.decoding_mode import DecodingMode
+
+SampleWords = [
+    "trak", "kasa", "masina", "kopil", "skoala", "prijeten", "kartea", "tʃer",
+    "dʒam", "ʃkoala", "tsara", "munte", "lumina", "fereastra", "pɡodul", "nork",
+    "nel", "mettso", "del", "kammin", "di", "nostra", "vita", "selva", "oskura",
+    "desokupado", "lektor", "sin", "huramento", "kreer", "kisjera", "libro",
+]
+
+
+def benchmark(converter: Phoneme2GraphemeConverter, words: list[str], repeats: int) -> float:
+    converter(words[:converter.batch_size])  # warmup
+    start = time.perf_counter()
+    for _ in range(repeats):
+        converter(words)
+    return len(words) * repeats / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reports P2G throughput for each decoding mode.")
+    parser.add_argument("--model_dir", default="./Processor/DeepGraphemizer/p2g_romanian_model")
+    parser.add_argument("--words", default=None,
+                        help="File with one Romanian phoneme sequence per line (defaults to a built-in sample)")
+    parser.add_argument("--count", type=int, default=2_048)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--batch_size", type=int, default=128)
+    args = parser.parse_args()
+
+    if args.words is not None:
+        with open(args.words, "r", encoding="utf-8") as f:
+            words = [line.strip() for line in f if line.strip()]
+    else:
+        words = SampleWords
+    words = (words * (args.count // len(words) + 1))[:args.count]
+
+    converter = Phoneme2GraphemeConverter(args.model_dir, batch_size=args.batch_size)
+    outputs = {}
+    for mode in DecodingMode:
+        converter.decoding_mode = mode
+        words_per_second = benchmark(converter, words, args.repeats)
+        outputs[mode] = converter(words)
+        print(f"[{mode}] {words_per_second:.1f} words/sec")
+
+    reference = outputs[DecodingMode.Checkpoint]
+    for mode, converted in outputs.items():
+        agreement = sum(a == b for a, b in zip(reference, converted)) / len(words)
+        print(f"[{mode}] {agreement:.2%} agreement with {DecodingMode.Checkpoint}")
@@ -1,14 +1,33 @@
+import math
 import torch
 from transformers.models.encoder_decoder import EncoderDecoderModel
 from transformers.tokenization_utils_fast import PreTrainedTokenizerFast
 from transformers.utils import logging as hf_logging
 
+from Processor.DeepPhonemizer.dp.preprocessing.utils import batchify_by_length
+from Processor.Domain.decoding_mode import DecodingMode
+from Processor.Domain.precision_mode import PrecisionMode
+
 
 class Phoneme2GraphemeConverter:
+    MaxLength = 50
+
     def __init__(self,
-                 model_dir: str = "./p2g_romanian_model"):
+                 model_dir: str = "./p2g_romanian_model",
+                 batch_size: int = 128,
+                 max_tokens_per_batch: int | None = 4_096,
+                 decoding_mode: DecodingMode = DecodingMode.Greedy,
+                 max_length_ratio: float = 2.0,
+                 max_length_margin: int = 4,
+                 precision: PrecisionMode = PrecisionMode.Float32):
         print("Initializing P2G ... ")
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.batch_size = batch_size
+        self.max_tokens_per_batch = max_tokens_per_batch
+        self.decoding_mode = decoding_mode
+        self.max_length_ratio = max_length_ratio
+        self.max_length_margin = max_length_margin
+        self.precision = precision
         initial_log_verbosity = hf_logging.get_verbosity()
         hf_logging.set_verbosity_error()
         print("Loading P2G ... ")
@@ -22,33 +41,73 @@ class Phoneme2GraphemeConverter:
         self.model.to(self.device)
 
         self.model.eval()
-        print("P2G initialized!")
+        self.model = precision.apply(self.model, self.device)
+        print(f"P2G initialized ({precision})!")
 
     @classmethod
     def __deformat(cls, phoneme: str):
         return "".join(phoneme.split())
 
-    def __call__(self, phonemes: str | list[str]) -> list[str] | str | None:
-        if isinstance(phonemes, str):
-            phonemes = [phonemes]
-            single_input = True
-        else:
-            single_input = False
+    def __batches(self, lengths: list[int]) -> list[list[int]]:
+        # indices sorted by input length, so that each batch pads as little as possible
+        order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+        return batchify_by_length(order,
+                                  lengths=[lengths[i] for i in order],
+                                  batch_size=self.batch_size,
+                                  max_tokens=self.max_tokens_per_batch)
 
+    def __generation_kwargs(self, phonemes: list[str]) -> dict:
+        match self.decoding_mode:
+            case DecodingMode.Checkpoint:
+                return {"max_length": self.MaxLength}
+            case DecodingMode.Greedy:
+                # a Romanian spelling is never much longer than its phoneme sequence,
+                # so there is no point in decoding up to the global limit
+                longest = max(len(self.__deformat(phoneme)) for phoneme in phonemes)
+                max_length = math.ceil(longest * self.max_length_ratio) + self.max_length_margin
+                return {
+                    "num_beams": 1,
+                    "do_sample": False,
+                    "use_cache": True,
+                    "eos_token_id": self.grapheme_tokenizer.eos_token_id,
+                    "pad_token_id": self.grapheme_tokenizer.pad_token_id,
+                    "max_length": min(max_length, self.MaxLength),
+                }
+            case _:
+                assert False
+
+    def __generate(self, phonemes: list[str]) -> list[str]:
         inputs = self.phoneme_tokenizer(phonemes, return_tensors="pt", padding=True, truncation=True).to(self.device)
         inputs["input_ids"] = inputs["input_ids"].long()
 
         with torch.no_grad():
-            try:
-                outputs = self.model.generate(**inputs, max_length=50)
-            except RuntimeError as re:
-                if "Expected tensor for argument" in str(re):
-                    return None if single_input else [None] * len(phonemes)
-                else:
-                    raise re
+            outputs = self.model.generate(**inputs, **self.__generation_kwargs(phonemes))
 
         decoded = self.grapheme_tokenizer.batch_decode(outputs, skip_special_tokens=True)
-        reformatted = [self.__deformat(word) for word in decoded]
+        return [self.__deformat(word) for word in decoded]
 
-        return reformatted[0] if single_input else reformatted
+    def __generate_or_fallback(self, phonemes: list[str]) -> list[str | None]:
+        try:
+            return self.__generate(phonemes)
+        except RuntimeError as re:
+            if "Expected tensor for argument" not in str(re):
+                raise re
+        if len(phonemes) == 1:
+            return [None]
+        # retry one by one, so that a bad input only loses its own word
+        return [self.__generate_or_fallback([phoneme])[0] for phoneme in phonemes]
 
+    def __call__(self, phonemes: str | list[str]) -> list[str] | str | None:
+        if isinstance(phonemes, str):
+            phonemes = [phonemes]
+            single_input = True
+        else:
+            single_input = False
+
+        reformatted = [None] * len(phonemes)
+        for batch in self.__batches([len(self.__deformat(phoneme)) for phoneme in phonemes]):
+            graphemes = self.__generate_or_fallback([phonemes[i] for i in batch])
+            for i, grapheme in zip(batch, graphemes):
+                reformatted[i] = grapheme
+
+        return reformatted[0] if single_input else reformatted
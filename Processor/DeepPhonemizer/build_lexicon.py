@@ -0,0 +1,30 @@
+import argparse
+import os
+import time
+
+from Processor.DeepPhonemizer.dp.lexicon import Lexicon, read_lexicon_entries
+from Processor.Domain.supported_language import SupportedLanguage
+
+if __name__ == "__main__":
+    # Builds <lang>_lexicon.idx from a text lexicon (combined_dataset.txt or a TSV file).
+    # Grapheme2PhonemeConverter memory-maps it and only sends the words it does not contain to the model.
+    parser = argparse.ArgumentParser(description="Builds the memory-mapped pronunciation lexicon of a language.")
+    parser.add_argument("--source", required=True,
+                        help="Text lexicon with 'language<TAB>word<TAB>phonemes' lines, "
+                             "or 'word<TAB>phonemes' lines with --columns 2")
+    parser.add_argument("--columns", type=int, choices=[2, 3], default=3,
+                        help="3 for a source with a language column (as combined_dataset.txt), 2 without one")
+    parser.add_argument("--language", required=True, choices=[str(lang) for lang in SupportedLanguage])
+    parser.add_argument("--models_dir", default="./Processor/DeepPhonemizer/g2p_latin_models/")
+    args = parser.parse_args()
+
+    lang = SupportedLanguage(args.language)
+    target = os.path.join(args.models_dir, lang.to_lexicon())
+    entries = read_lexicon_entries(args.source, columns=args.columns, lang=str(lang))
+    print(f"Read {len(entries)} entries from {args.source}")
+    count = Lexicon.build(entries, target)
+
+    start = time.perf_counter()
+    lexicon = Lexicon(target)
+    print(f"Wrote {count} words to {target}, opening it takes {(time.perf_counter() - start) * 1000:.2f}ms")
+    lexicon.close()
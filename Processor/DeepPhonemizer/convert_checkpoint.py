@@ -0,0 +1,26 @@
+import argparse
+import os
+
+from expose_deep_phonemizer_module import expose_dp
+from Processor.Domain.supported_language import SupportedLanguage
+
+expose_dp()
+
+from Processor.DeepPhonemizer.dp.model.model import load_checkpoint, save_safetensors_checkpoint
+
+if __name__ == "__main__":
+    # Converts the pickled .pt G2P checkpoints to best_<lang>_model.safetensors plus a best_<lang>_model.json sidecar.
+    # Grapheme2PhonemeConverter picks the safetensors file up automatically once it exists.
+    parser = argparse.ArgumentParser(description="Converts the G2P checkpoints to memory mappable safetensors.")
+    parser.add_argument("--models_dir", default="./Processor/DeepPhonemizer/g2p_latin_models/")
+    parser.add_argument("--languages", nargs="+", default=[str(lang) for lang in SupportedLanguage],
+                        choices=[str(lang) for lang in SupportedLanguage])
+    args = parser.parse_args()
+
+    for lang in [SupportedLanguage(code) for code in args.languages]:
+        source = os.path.join(args.models_dir, lang.to_best_model())
+        target = os.path.join(args.models_dir, lang.to_best_weights())
+        print(f"Converting {source} ... ")
+        _, checkpoint = load_checkpoint(source, device="cpu")
+        save_safetensors_checkpoint(checkpoint, target)
+        print(f"Wrote {target} and its json sidecar!")
@@ -0,0 +1,186 @@
+import mmap
+import os
+import struct
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_MAGIC = b'DPLEX001'
+_HEADER = struct.Struct('<8sQ')
+
+
+def normalize_word(word: str) -> str:
+    return word.casefold()
+
+
+def index_entries(entries: Iterable[Tuple[str, str]]) -> Dict[str, str]:
+    """
+    Maps normalized words to their phonemes. Of the spellings of a word the lowercase one wins,
+    then the first one, so the lexicon and the checkpoint dictionary agree on words differing in case only.
+
+    Args:
+      entries (Iterable[Tuple[str, str]]): (word, phonemes) pairs.
+
+    Returns:
+      Dict[str, str]: Phonemes of every normalized word.
+    """
+
+    index = {}
+    for word, phonemes in sorted(entries, key=lambda entry: entry[0] != entry[0].lower()):
+        index.setdefault(normalize_word(word), phonemes)
+    return index
+
+
+class _Keys:
+
+    """Sequence view over the sorted keys of a mapped lexicon, so that bisect can search it in place."""
+
+    def __init__(self, lexicon: 'Lexicon') -> None:
+        self.lexicon = lexicon
+
+    def __len__(self) -> int:
+        return len(self.lexicon)
+
+    def __getitem__(self, index: int) -> bytes:
+        return self.lexicon._key(index)
+
+
+class Lexicon:
+
+    """
+    Read-only, casefold-normalized word -> phonemes index stored in a single memory-mapped file.
+    Keys are sorted by their utf-8 bytes, so opening the file costs nothing but the mmap call and
+    every process opening it shares the same page cache copy.
+
+    File layout: magic, entry count, key offsets (count + 1 x uint64), value offsets (count + 1 x uint64),
+    keys blob, values blob.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Opens a lexicon file written by Lexicon.build.
+
+        Args:
+          path (str): Path to the lexicon file.
+        """
+
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._count = _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC:
+            raise ValueError(f'Not a lexicon file: {path}')
+        view = memoryview(self._map)
+        offsets_size = (self._count + 1) * 8
+        self._key_offsets = view[_HEADER.size:_HEADER.size + offsets_size].cast('Q')
+        self._value_offsets = view[_HEADER.size + offsets_size:_HEADER.size + 2 * offsets_size].cast('Q')
+        self._keys_start = _HEADER.size + 2 * offsets_size
+        self._values_start = self._keys_start + self._key_offsets[self._count]
+        self._sorted_keys = _Keys(self)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _key(self, index: int) -> bytes:
+        return self._map[self._keys_start + self._key_offsets[index]:self._keys_start + self._key_offsets[index + 1]]
+
+    def _value(self, index: int) -> str:
+        start, end = self._value_offsets[index], self._value_offsets[index + 1]
+        return self._map[self._values_start + start:self._values_start + end].decode('utf-8')
+
+    def get(self, word: str) -> Optional[str]:
+        """Returns the phonemes of a word (matched case-insensitively) or None if it is not in the lexicon."""
+
+        return self.lookup_many([word]).get(word)
+
+    def lookup_many(self, words: Iterable[str]) -> Dict[str, str]:
+        """
+        Looks up many words at once. The queries are sorted, so each binary search starts
+        where the previous one ended.
+
+        Args:
+          words (Iterable[str]): Words to look up, matched case-insensitively.
+
+        Returns:
+          Dict[str, str]: Phonemes of the words found in the lexicon, missing words are left out.
+        """
+
+        keys = {}
+        for word in words:
+            keys.setdefault(normalize_word(word).encode('utf-8'), []).append(word)
+        found, low = {}, 0
+        for key in sorted(keys):
+            index = bisect_left(self._sorted_keys, key, lo=low)
+            low = index
+            if index < self._count and self._key(index) == key:
+                phonemes = self._value(index)
+                for word in keys[key]:
+                    found[word] = phonemes
+        return found
+
+    def close(self) -> None:
+        self._key_offsets.release()
+        self._value_offsets.release()
+        self._map.close()
+
+    @staticmethod
+    def build(entries: Iterable[Tuple[str, str]], path: str) -> int:
+        """
+        Writes a lexicon file. Words are casefolded, the entry of a word is picked by index_entries.
+
+        Args:
+          entries (Iterable[Tuple[str, str]]): (word, phonemes) pairs.
+          path (str): Path to the lexicon file to write.
+
+        Returns:
+          int: Number of distinct words written.
+        """
+
+        index = {word.encode('utf-8'): phonemes.encode('utf-8') for word, phonemes in index_entries(entries).items()}
+        keys = sorted(index)
+        key_offsets, value_offsets = [0], [0]
+        for key in keys:
+            key_offsets.append(key_offsets[-1] + len(key))
+            value_offsets.append(value_offsets[-1] + len(index[key]))
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, len(keys)))
+            f.write(struct.pack(f'<{len(key_offsets)}Q', *key_offsets))
+            f.write(struct.pack(f'<{len(value_offsets)}Q', *value_offsets))
+            f.write(b''.join(keys))
+            f.write(b''.join(index[key] for key in keys))
+        os.replace(temp_path, path)
+        return len(keys)
+
+
+def read_lexicon_entries(path: str, columns: int = 3, lang: Optional[str] = None) -> List[Tuple[str, str]]:
+    """
+    Reads (word, phonemes) pairs from a text lexicon such as combined_dataset.txt or a TSV file.
+    Every line has the declared layout, 'language<sep>word<sep>phonemes' for three columns or
+    'word<sep>phonemes' for two, where <sep> is a tab if the line has one and whitespace otherwise.
+    Lines of other languages are skipped when a language is given.
+
+    Args:
+      path (str): Path to the text lexicon.
+      columns (int): Number of columns of the lexicon, 3 (with a language column) or 2. (Default value = 3)
+      lang (str, optional): Language to keep from a three column lexicon.
+
+    Returns:
+      List[Tuple[str, str]]: (word, phonemes) pairs in file order.
+    """
+
+    if columns not in (2, 3):
+        raise ValueError(f'A lexicon has 2 or 3 columns, not {columns}')
+    entries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.rstrip('\n')
+            if len(line.strip()) == 0:
+                continue
+            # the last column takes the rest of the line, phonemes may be separated by spaces
+            values = line.split('\t', columns - 1) if '\t' in line else line.split(maxsplit=columns - 1)
+            if len(values) != columns:
+                raise ValueError(f'{path}:{line_number}: expected {columns} columns, got {line!r}')
+            if columns == 2:
+                entries.append((values[0], values[1].strip()))
+            elif lang is None or values[0] == lang:
+                entries.append((values[1], values[2].strip()))
+    return entries
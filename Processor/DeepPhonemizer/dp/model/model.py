@@ -1,5 +1,8 @@
+import hashlib
+import json
 from abc import ABC, abstractmethod
-from typing import Tuple, Dict, Any
+from pathlib import Path
+from typing import Tuple, Dict, Any, Optional
 
 import torch
 import torch.nn as nn
@@ -131,9 +134,134 @@ def load_checkpoint(checkpoint_path: str, device: str = 'cpu') -> Tuple[Model, D
              and the second element is a dictionary (config).
     """
 
+    if Path(checkpoint_path).suffix == '.safetensors':
+        return load_safetensors_checkpoint(checkpoint_path, device=device)
     device = torch.device(device)
     checkpoint = torch.load(checkpoint_path, map_location=device, weights_only=False)
     model = create_model(config=checkpoint['config'])
     model.load_state_dict(checkpoint['model'])
     model.eval()
     return model, checkpoint
+
+
+def _to_sidecar(checkpoint: Dict[str, Any]) -> Dict[str, Any]:
+    return {'config': checkpoint['config'],
+            'preprocessor': checkpoint['preprocessor'].to_dict(),
+            'phoneme_dict': checkpoint.get('phoneme_dict'),
+            'step': checkpoint.get('step')}
+
+
+def _from_sidecar(sidecar: Dict[str, Any]) -> Dict[str, Any]:
+    checkpoint = {'config': sidecar['config'],
+                  'preprocessor': Preprocessor.from_dict(sidecar['preprocessor']),
+                  'step': sidecar['step']}
+    if sidecar['phoneme_dict'] is not None:
+        checkpoint['phoneme_dict'] = sidecar['phoneme_dict']
+    return checkpoint
+
+
+def save_safetensors_checkpoint(checkpoint: Dict[str, Any], weights_path: str) -> None:
+    """
+    Stores the weights of a checkpoint as safetensors and everything else (config, preprocessor,
+    phoneme dictionary, step) in a json sidecar next to it, e.g. model.safetensors and model.json.
+
+    Args:
+        checkpoint (Dict[str, Any]): Checkpoint dictionary as returned by load_checkpoint.
+        weights_path (str): Path to the weights file (.safetensors).
+    """
+
+    from safetensors.torch import save_file
+
+    weights = {name: tensor.detach().cpu().contiguous() for name, tensor in checkpoint['model'].items()}
+    save_file(weights, weights_path)
+    with open(Path(weights_path).with_suffix('.json'), 'w', encoding='utf-8') as f:
+        json.dump(_to_sidecar(checkpoint), f, ensure_ascii=False)
+
+
+def load_safetensors_checkpoint(weights_path: str, device: str = 'cpu') -> Tuple[Model, Dict[str, Any]]:
+    """
+    Initializes a model from a safetensors file and its json sidecar (see save_safetensors_checkpoint).
+    On cpu the parameters point straight into the memory mapped file instead of being copied,
+    so every process loading the same file shares one page cache copy of the weights.
+
+    Args:
+        weights_path (str): Path to the weights file (.safetensors).
+        device (str): Device to put the model to ('cpu' or 'cuda').
+
+    Returns: Tuple: The first element is a Model (the loaded model)
+             and the second element is a dictionary (config, preprocessor, phoneme_dict, step).
+    """
+
+    from safetensors.torch import load_file
+
+    with open(Path(weights_path).with_suffix('.json'), 'r', encoding='utf-8') as f:
+        checkpoint = _from_sidecar(json.load(f))
+    # built without allocating weights, the mapped tensors are then assigned instead of copied in
+    with torch.device('meta'):
+        model = create_model(config=checkpoint['config'])
+    model.load_state_dict(load_file(weights_path, device='cpu'), assign=True)
+    model.to(torch.device(device))
+    model.eval()
+    return model, checkpoint
+
+
+def scripted_path(checkpoint_path: str) -> str:
+    """Path of the TorchScript export belonging to a checkpoint, e.g. model.pt -> model.scripted.pt"""
+
+    return str(Path(checkpoint_path).with_suffix('')) + '.scripted.pt'
+
+
+def checkpoint_digest(checkpoint_path: str) -> str:
+    """sha256 of a checkpoint file, together with its json sidecar for a safetensors checkpoint."""
+
+    digest = hashlib.sha256()
+    paths = [Path(checkpoint_path)]
+    if paths[0].suffix == '.safetensors':
+        paths.append(paths[0].with_suffix('.json'))
+    for path in paths:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def save_scripted_checkpoint(model: Model, checkpoint: Dict[str, Any], path: str, source_digest: str) -> None:
+    """
+    Compiles the model with TorchScript and stores it together with the config, preprocessor tables,
+    phoneme dictionary and step, so that loading it needs neither the model code nor a pickled checkpoint.
+
+    Args:
+        model (Model): Model in eval mode, as returned by load_checkpoint.
+        checkpoint (Dict[str, Any]): Checkpoint dictionary as returned by load_checkpoint.
+        path (str): Path to the exported file (see scripted_path).
+        source_digest (str): checkpoint_digest of the exported checkpoint, checked when loading the export.
+    """
+
+    scripted = torch.jit.script(model.cpu().eval())
+    torch.jit.save(scripted, path,
+                   _extra_files={'checkpoint.json': json.dumps(_to_sidecar(checkpoint), ensure_ascii=False),
+                                 'source.sha256': source_digest})
+
+
+def load_scripted_checkpoint(path: str,
+                             device: str = 'cpu',
+                             source_digest: Optional[str] = None) -> Tuple[torch.jit.ScriptModule, Dict[str, Any]]:
+    """
+    Loads a model exported by save_scripted_checkpoint.
+
+    Args:
+        path (str): Path to the exported file.
+        device (str): Device to put the model to ('cpu' or 'cuda').
+        source_digest (str, optional): checkpoint_digest of the checkpoint the export must have been made from.
+            A RuntimeError is raised for an export of another (e.g. older) checkpoint. (Default value = None)
+
+    Returns: Tuple: The first element is the scripted model (exposing generate)
+             and the second element is a dictionary (config, preprocessor, phoneme_dict, step).
+    """
+
+    extra_files = {'checkpoint.json': '', 'source.sha256': ''}
+    model = torch.jit.load(path, map_location=torch.device(device), _extra_files=extra_files)
+    if source_digest is not None and extra_files['source.sha256'] != source_digest:
+        raise RuntimeError(f'{path} was not exported from the current checkpoint')
+    model.eval()
+    return model, _from_sidecar(json.loads(extra_files['checkpoint.json']))
@@ -1,13 +1,12 @@
-from typing import Dict, List, Tuple
+from typing import Iterator, List, Optional, Tuple, Union
 
 import torch
-from torch.nn.utils.rnn import pad_sequence
 
 from Processor.DeepPhonemizer.dp import Prediction
 from Processor.DeepPhonemizer.dp.model.model import load_checkpoint
-from Processor.DeepPhonemizer.dp.model.utils import _get_len_util_stop
+from Processor.DeepPhonemizer.dp.model.utils import _get_len_util_stop_batch
 from Processor.DeepPhonemizer.dp.preprocessing.text import Preprocessor
-from Processor.DeepPhonemizer.dp.preprocessing.utils import batchify, product
+from Processor.DeepPhonemizer.dp.preprocessing.utils import batchify_by_length, product
 
 
 class Predictor:
@@ -32,7 +31,9 @@ class Predictor:
     def __call__(self,
                  words: List[str],
                  lang: str,
-                 batch_size: int = 8) -> List[Prediction]:
+                 batch_size: int = 8,
+                 max_tokens_per_batch: Optional[int] = None,
+                 phonemes_only: bool = False) -> Union[List[Prediction], List[str]]:
         """
         Predicts phonemes for a list of words.
 
@@ -40,67 +41,79 @@ class Predictor:
           words (list): List of words to predict.
           lang (str): Language of texts.
           batch_size (int): Size of batch for model input to speed up inference.
+          max_tokens_per_batch (int, optional): Upper bound of padded input tokens per batch.
+          phonemes_only (bool): Whether to return just the phoneme strings, without building
+               token and probability lists for every word. (Default value = False)
 
         Returns:
-          List[Prediction]: A list of result objects containing (word, phonemes, phoneme_tokens, token_probs, confidence)
+          Union[List[Prediction], List[str]]: A list of result objects containing
+          (word, phonemes, phoneme_tokens, token_probs, confidence), or the phonemes of each word if phonemes_only is set
         """
 
-        predictions = dict()
-        valid_texts = set()
-
-        # handle words that result in an empty input to the model
-        for word in words:
-            input_seq = self.text_tokenizer(sentence=word, language=lang)
-            decoded = self.text_tokenizer.decode(
-                sequence=input_seq, remove_special_tokens=True)
-            if len(decoded) == 0:
-                predictions[word] = ([], [])
-            else:
-                valid_texts.add(word)
-
-        valid_texts = sorted(list(valid_texts), key=lambda x: len(x))
-        batch_pred = self._predict_batch(texts=valid_texts, batch_size=batch_size,
-                                         language=lang)
-        predictions.update(batch_pred)
-
-        output = []
-        for word in words:
-            tokens, probs = predictions[word]
-            out_phons = self.phoneme_tokenizer.decode(
-                sequence=tokens, remove_special_tokens=True)
-            out_phons_tokens = self.phoneme_tokenizer.decode(
-                sequence=tokens, remove_special_tokens=False)
-            output.append(Prediction(word=word,
-                                     phonemes=''.join(out_phons),
-                                     phoneme_tokens=out_phons_tokens,
-                                     confidence=product(probs),
-                                     token_probs=probs))
-
-        return output
-
-    def _predict_batch(self,
-                       texts: List[str],
-                       batch_size: int,
-                       language: str) \
-            -> Dict[str, Tuple[List[int], List[float]]]:
+        unique_words = list(dict.fromkeys(words))
+        inputs, lengths, empty = self.text_tokenizer.encode_batch(unique_words, lang)
+
+        # words that result in an empty input to the model are not predicted
+        is_empty, input_lengths = empty.tolist(), lengths.tolist()
+        valid = sorted((i for i in range(len(unique_words)) if not is_empty[i]), key=lambda i: input_lengths[i])
+        batches = self._predict_batches(texts=[unique_words[i] for i in valid],
+                                        inputs=inputs[valid],
+                                        lengths=lengths[valid],
+                                        batch_size=batch_size,
+                                        language=lang,
+                                        max_tokens_per_batch=max_tokens_per_batch)
+
+        if phonemes_only:
+            phonemes = {word: '' for word, empty_input in zip(unique_words, is_empty) if empty_input}
+            for text_batch, output_batch, _, seq_lens in batches:
+                decoded = self.phoneme_tokenizer.decode_batch(output_batch, lengths=seq_lens,
+                                                              remove_special_tokens=True)
+                phonemes.update(zip(text_batch, map(''.join, decoded)))
+            return [phonemes[word] for word in words]
+
+        predictions = {word: ([], []) for word, empty_input in zip(unique_words, is_empty) if empty_input}
+        for text_batch, output_batch, probs_batch, seq_lens in batches:
+            for text, output, probs, seq_len in zip(text_batch, output_batch.tolist(), probs_batch.tolist(), seq_lens):
+                predictions[text] = (output[:seq_len], probs[:seq_len])
+
+        # every output is decoded once, the phonemes are its tokens without the special ones
+        phoneme_tokens = self.phoneme_tokenizer.decode_batch([predictions[word][0] for word in unique_words])
+        special_tokens = self.phoneme_tokenizer.special_tokens
+        results = dict()
+        for word, out_phons_tokens in zip(unique_words, phoneme_tokens):
+            probs = predictions[word][1]
+            results[word] = Prediction(word=word,
+                                       phonemes=''.join(t for t in out_phons_tokens if t not in special_tokens),
+                                       phoneme_tokens=out_phons_tokens,
+                                       confidence=product(probs),
+                                       token_probs=probs)
+
+        return [results[word] for word in words]
+
+    def _predict_batches(self,
+                         texts: List[str],
+                         inputs: torch.Tensor,
+                         lengths: torch.Tensor,
+                         batch_size: int,
+                         language: str,
+                         max_tokens_per_batch: Optional[int] = None) \
+            -> Iterator[Tuple[List[str], torch.Tensor, torch.Tensor, List[int]]]:
         """
-        Returns dictionary with key = word and val = Tuple of (phoneme tokens, phoneme probs)
+        Yields Tuples of (texts, phoneme tokens, phoneme probs, output length until the end token) per model batch.
+        The texts come encoded by SequenceTokenizer.encode_batch and sorted by ascending length.
         """
 
-        predictions = dict()
-        text_batches = batchify(texts, batch_size)
-        for text_batch in text_batches:
-            input_batch, lens_batch = [], []
-            for text in text_batch:
-                input_seq = self.text_tokenizer(text, language)
-                input_batch.append(torch.tensor(input_seq))
-                lens_batch.append(torch.tensor(len(input_seq)))
-
-            input_batch = pad_sequence(sequences=input_batch,
-                                       batch_first=True, padding_value=0)
-            lens_batch = torch.stack(lens_batch)
-            start_index = self.phoneme_tokenizer.get_start_index(language)
-            start_indices = torch.tensor([start_index]*input_batch.size(0)).to(input_batch.device)
+        # texts are sorted by length, so neighbouring items form batches with little padding
+        index_batches = batchify_by_length(list(range(len(texts))),
+                                           lengths=lengths.tolist(),
+                                           batch_size=batch_size,
+                                           max_tokens=max_tokens_per_batch)
+        start_index = self.phoneme_tokenizer.get_start_index(language)
+        for index_batch in index_batches:
+            text_batch = [texts[i] for i in index_batch]
+            lens_batch = lengths[index_batch]
+            input_batch = inputs[index_batch, :int(lens_batch.max())]
+            start_indices = torch.full((input_batch.size(0),), start_index, dtype=torch.long, device=input_batch.device)
             batch = {
                 'text': input_batch,
                 'text_len': lens_batch,
@@ -109,11 +122,8 @@ class Predictor:
             with torch.no_grad():
                 output_batch, probs_batch = self.model.generate(batch)
             output_batch, probs_batch = output_batch.cpu(), probs_batch.cpu()
-            for text, output, probs in zip(text_batch, output_batch, probs_batch):
-                seq_len = _get_len_util_stop(output, self.phoneme_tokenizer.end_index)
-                predictions[text] = (output[:seq_len].tolist(), probs[:seq_len].tolist())
-
-        return predictions
+            seq_lens = _get_len_util_stop_batch(output_batch, self.phoneme_tokenizer.end_index).tolist()
+            yield text_batch, output_batch, probs_batch, seq_lens
 
     @classmethod
     def from_checkpoint(cls, checkpoint_path: str, device='cpu') -> 'Predictor':
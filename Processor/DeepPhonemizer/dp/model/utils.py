@@ -2,7 +2,6 @@ import math
 from typing import Tuple
 
 import torch
-from torch.nn.utils.rnn import pad_sequence
 
 
 class PositionalEncoding(torch.nn.Module):
@@ -38,6 +37,8 @@ class PositionalEncoding(torch.nn.Module):
 def get_dedup_tokens(logits_batch: torch.Tensor) \
         -> Tuple[torch.Tensor, torch.Tensor]:
     """Converts a batch of logits into the batch most probable tokens and their probabilities.
+    Blank (index 0) predictions are dropped and consecutive repeats are collapsed into one token
+    carrying the highest probability of its run, for the whole batch at once.
 
     Args:
       logits_batch (Tensor): Batch of logits (N x T x V).
@@ -49,27 +50,32 @@ def get_dedup_tokens(logits_batch: torch.Tensor) \
     """
 
     logits_batch = logits_batch.softmax(-1)
-    out_tokens, out_probs = [], []
-    for i in range(logits_batch.size(0)):
-        logits = logits_batch[i]
-        max_logits, max_indices = torch.max(logits, dim=-1)
-        max_logits = max_logits[max_indices!=0]
-        max_indices = max_indices[max_indices!=0]
-        cons_tokens, counts = torch.unique_consecutive(
-            max_indices, return_counts=True)
-        out_probs_i = torch.zeros(len(counts), device=logits.device)
-        ind = 0
-        for j, c in enumerate(counts):
-            max_logit = max_logits[ind:ind + c].max()
-            out_probs_i[j] = max_logit
-            ind = ind + c
-        out_tokens.append(cons_tokens)
-        out_probs.append(out_probs_i)
-
-    out_tokens = pad_sequence(out_tokens, batch_first=True, padding_value=0.).long()
-    out_probs = pad_sequence(out_probs, batch_first=True, padding_value=0.)
-
-    return out_tokens, out_probs
+    max_logits, max_indices = torch.max(logits_batch, dim=-1)
+    batch_size, seq_len = max_indices.size(0), max_indices.size(1)
+
+    # move the non-blank predictions to the front of each row, keeping their order
+    keep = max_indices != 0
+    order = torch.sort((~keep).long(), dim=1, stable=True)[1]
+    max_indices = max_indices.gather(1, order)
+    max_logits = max_logits.gather(1, order)
+    keep = keep.gather(1, order)
+
+    # a run starts at every kept position holding a different token than its predecessor
+    previous = torch.cat([torch.full((batch_size, 1), -1, dtype=max_indices.dtype, device=max_indices.device),
+                          max_indices[:, :-1]], dim=1)
+    run_starts = keep & (max_indices != previous)
+    run_ids = run_starts.long().cumsum(dim=1) - 1
+    # dropped positions are scattered into an extra column that is cut off below
+    run_ids = torch.where(keep, run_ids, torch.full_like(run_ids, seq_len))
+    num_runs = run_starts.sum(dim=1)
+    max_runs = int(num_runs.max()) if batch_size > 0 else 0
+
+    out_tokens = torch.zeros((batch_size, seq_len + 1), dtype=torch.long, device=max_indices.device)
+    out_tokens = out_tokens.scatter(1, run_ids, max_indices.long())
+    out_probs = torch.zeros((batch_size, seq_len + 1), dtype=max_logits.dtype, device=max_logits.device)
+    out_probs = out_probs.scatter_reduce(1, run_ids, max_logits, reduce='amax', include_self=False)
+
+    return out_tokens[:, :max_runs], out_probs[:, :max_runs]
 
 
 def _generate_square_subsequent_mask(sz: int) -> torch.Tensor:
@@ -89,6 +95,13 @@ def _get_len_util_stop(sequence: torch.Tensor, end_index: int) -> int:
     return len(sequence)
 
 
+def _get_len_util_stop_batch(sequences: torch.Tensor, end_index: int) -> torch.Tensor:
+    """Batched _get_len_util_stop: length up to and including the first end_index of each row."""
+    is_end = sequences == end_index
+    first_end = is_end.long().argmax(dim=1)
+    return torch.where(is_end.any(dim=1), first_end + 1, torch.full_like(first_end, sequences.size(1)))
+
+
 def _trim_util_stop(sequence: torch.Tensor, end_index: int) -> torch.Tensor:
     seq_len = _get_len_util_stop(sequence, end_index)
     return sequence[:seq_len]
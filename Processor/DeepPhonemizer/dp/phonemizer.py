@@ -1,37 +1,74 @@
+import os
 import re
+from functools import lru_cache
 from itertools import zip_longest
-from typing import Dict, Union, List, Set
+from typing import Dict, Union, List, Optional, Set, Tuple, Iterable
 
 from Processor.DeepPhonemizer.dp import PhonemizerResult
-from Processor.DeepPhonemizer.dp.model.model import load_checkpoint
+from Processor.DeepPhonemizer.dp.lexicon import Lexicon, index_entries, normalize_word
+from Processor.DeepPhonemizer.dp.model.model import checkpoint_digest, load_checkpoint, load_scripted_checkpoint, \
+    scripted_path
 from Processor.DeepPhonemizer.dp.model.predictor import Predictor
 from Processor.DeepPhonemizer.dp.utils.logging import get_logger
 
 DEFAULT_PUNCTUATION = '().,:?!/–'
 
 
+class _CleaningTable(dict):
+
+    """str.translate table dropping every character that is neither alphanumeric nor kept punctuation,
+    filled lazily per code point since the set of characters to drop is open-ended."""
+
+    def __init__(self, punc_set: Set[str]) -> None:
+        super().__init__()
+        self.punc_set = punc_set
+
+    def __missing__(self, code_point: int) -> Optional[int]:
+        char = chr(code_point)
+        kept = code_point if char.isalnum() or char in self.punc_set else None
+        self[code_point] = kept
+        return kept
+
+
+@lru_cache(maxsize=16)
+def _punctuation_tables(punctuation: str) -> Tuple[Set[str], re.Pattern, _CleaningTable]:
+    punc_set = set(punctuation + '- ')
+    punc_pattern = re.compile(f'([{punctuation + " "}])')
+    return punc_set, punc_pattern, _CleaningTable(punc_set)
+
+
 class Phonemizer:
 
     def __init__(self,
                  predictor: Predictor,
-                 lang_phoneme_dict: Dict[str, Dict[str, str]] = None) -> None:
+                 lang_phoneme_dict: Dict[str, Dict[str, str]] = None,
+                 lexicons: Dict[str, Lexicon] = None) -> None:
         """
         Initializes a phonemizer with a ready predictor.
 
         Args:
             predictor (Predictor): Predictor object carrying the trained transformer model.
             lang_phoneme_dict (Dict[str, Dict[str, str]], optional): Word-phoneme dictionary for each language.
+            lexicons (Dict[str, Lexicon], optional): External memory-mapped lexicon for each language,
+                consulted for the words missing from lang_phoneme_dict.
         """
 
         self.predictor = predictor
         self.lang_phoneme_dict = lang_phoneme_dict
+        self.lexicons = lexicons if lexicons is not None else dict()
+        # casefolded once here instead of probing exact, lower and title case for every word;
+        # lowercase spellings win over other ones, as in the lexicon files
+        self._lang_index = dict()
+        for lang, phoneme_dict in (lang_phoneme_dict or dict()).items():
+            self._lang_index[lang] = index_entries(phoneme_dict.items())
 
     def __call__(self,
                  text: Union[str, List[str]],
                  lang: str,
                  punctuation: str = DEFAULT_PUNCTUATION,
                  expand_acronyms: bool = True,
-                 batch_size:int = 8) -> Union[str, List[str]]:
+                 batch_size: int = 8,
+                 max_tokens_per_batch: Optional[int] = None) -> Union[str, List[str]]:
         """
         Phonemizes a single text or list of texts.
 
@@ -41,6 +78,7 @@ class Phonemizer:
           punctuation (str): Punctuation symbols by which the texts are split.
           expand_acronyms (bool): Whether to expand an acronym, e.g. DIY -> D-I-Y.
           batch_size (int): Batch size of model to speed up inference.
+          max_tokens_per_batch (int, optional): Upper bound of padded input tokens per model batch.
 
         Returns:
           Union[str, List[str]]: Phonemized text as string, or list of strings, respectively.
@@ -48,8 +86,11 @@ class Phonemizer:
 
         single_input_string = isinstance(text, str)
         texts = [text] if single_input_string else text
+        # only the joined phonemes are returned, so no per word prediction objects are built
         result = self.phonemize_list(texts=texts, lang=lang,
-                                     punctuation=punctuation, expand_acronyms=expand_acronyms)
+                                     punctuation=punctuation, expand_acronyms=expand_acronyms,
+                                     batch_size=batch_size, max_tokens_per_batch=max_tokens_per_batch,
+                                     phonemes_only=True)
 
         phoneme_lists = [''.join(phoneme_list) for phoneme_list in result.phonemes]
 
@@ -63,7 +104,9 @@ class Phonemizer:
                        lang: str,
                        punctuation: str = DEFAULT_PUNCTUATION,
                        expand_acronyms: bool = True,
-                       batch_size: int = 8) -> PhonemizerResult:
+                       batch_size: int = 8,
+                       max_tokens_per_batch: Optional[int] = None,
+                       phonemes_only: bool = False) -> PhonemizerResult:
 
         """Phonemizes a list of texts and returns tokenized texts,
         phonemes and word predictions with probabilities.
@@ -74,26 +117,26 @@ class Phonemizer:
           punctuation (str): Punctuation symbols by which the texts are split. (Default value = DEFAULT_PUNCTUATION)
           expand_acronyms (bool): Whether to expand an acronym, e.g. DIY -> D-I-Y. (Default value = True)
           batch_size (int): Batch size of model to speed up inference. (Default value = 8)
+          max_tokens_per_batch (int, optional): Upper bound of padded input tokens per model batch.
+                                                (Default value = None, no bound)
+          phonemes_only (bool): Whether to skip building the token and probability lists of the predictions,
+                                leaving the predictions of the result empty. (Default value = False)
 
         Returns:
           PhonemizerResult: Object containing original texts, phonemes, split texts, split phonemes, and predictions.
 
         """
 
-        punc_set = set(punctuation + '- ')
-        punc_pattern = re.compile(f'([{punctuation + " "}])')
+        punc_set, punc_pattern, cleaning_table = _punctuation_tables(punctuation)
 
         split_text, cleaned_words = [], set()
         for text in texts:
-            cleaned_text = ''.join([t for t in text if t.isalnum() or t in punc_set])
-            split = re.split(punc_pattern, cleaned_text)
-            split = [s for s in split if len(s) > 0]
+            split = [s for s in punc_pattern.split(text.translate(cleaning_table)) if len(s) > 0]
             split_text.append(split)
             cleaned_words.update(split)
 
         # collect dictionary phonemes for words and hyphenated words
-        word_phonemes = {word: self._get_dict_entry(word=word, lang=lang, punc_set=punc_set)
-                         for word in cleaned_words}
+        word_phonemes = self._get_dict_entries(words=cleaned_words, lang=lang, punc_set=punc_set)
 
         # if word is not in dictionary, split it into subwords
         words_to_split = [w for w in cleaned_words if word_phonemes[w] is None]
@@ -107,10 +150,7 @@ class Phonemizer:
         # collect dictionary entries of subwords
         subwords = {w for values in word_splits.values() for w in values}
         subwords = {w for w in subwords if w not in word_phonemes}
-        for subword in subwords:
-            word_phonemes[subword] = self._get_dict_entry(word=subword,
-                                                          lang=lang,
-                                                          punc_set=punc_set)
+        word_phonemes.update(self._get_dict_entries(words=subwords, lang=lang, punc_set=punc_set))
 
         # predict all subwords that are missing in the phoneme dict
         words_to_predict = [word for word, phons in word_phonemes.items()
@@ -118,10 +158,16 @@ class Phonemizer:
 
         predictions = self.predictor(words=words_to_predict,
                                      lang=lang,
-                                     batch_size=batch_size)
+                                     batch_size=batch_size,
+                                     max_tokens_per_batch=max_tokens_per_batch,
+                                     phonemes_only=phonemes_only)
 
-        word_phonemes.update({pred.word: pred.phonemes for pred in predictions})
-        pred_dict = {pred.word: pred for pred in predictions}
+        if phonemes_only:
+            word_phonemes.update(zip(words_to_predict, predictions))
+            pred_dict = dict()
+        else:
+            word_phonemes.update({pred.word: pred.phonemes for pred in predictions})
+            pred_dict = {pred.word: pred for pred in predictions}
 
         # collect all phonemes
         phoneme_lists = []
@@ -141,23 +187,22 @@ class Phonemizer:
                                 split_phonemes=phoneme_lists,
                                 predictions=pred_dict)
 
-    def _get_dict_entry(self,
-                        word: str,
-                        lang: str,
-                        punc_set: Set[str]) -> Union[str, None]:
-        if word in punc_set or len(word) == 0:
-            return word
-        if not self.lang_phoneme_dict or lang not in self.lang_phoneme_dict:
-            return None
-        phoneme_dict = self.lang_phoneme_dict[lang]
-        if word in phoneme_dict:
-            return phoneme_dict[word]
-        elif word.lower() in phoneme_dict:
-            return phoneme_dict[word.lower()]
-        elif word.title() in phoneme_dict:
-            return phoneme_dict[word.title()]
-        else:
-            return None
+    def _get_dict_entries(self,
+                          words: Iterable[str],
+                          lang: str,
+                          punc_set: Set[str]) -> Dict[str, Union[str, None]]:
+        entries, missing = dict(), []
+        index = self._lang_index.get(lang, dict())
+        for word in words:
+            if word in punc_set or len(word) == 0:
+                entries[word] = word
+            else:
+                entries[word] = index.get(normalize_word(word))
+                if entries[word] is None:
+                    missing.append(word)
+        if len(missing) > 0 and lang in self.lexicons:
+            entries.update(self.lexicons[lang].lookup_many(missing))
+        return entries
 
     @staticmethod
     def _expand_acronym(word: str) -> str:
@@ -187,19 +232,37 @@ class Phonemizer:
     def from_checkpoint(cls,
                         checkpoint_path: str,
                         device='cpu',
-                        lang_phoneme_dict: Dict[str, Dict[str, str]] = None) -> 'Phonemizer':
+                        lang_phoneme_dict: Dict[str, Dict[str, str]] = None,
+                        prefer_scripted: bool = False,
+                        lexicons: Dict[str, Lexicon] = None) -> 'Phonemizer':
         """Initializes a Phonemizer object from a model checkpoint (.pt file).
 
         Args:
           checkpoint_path (str): Path to the .pt checkpoint file.
           device (str): Device to send the model to ('cpu' or 'cuda'). (Default value = 'cpu')
           lang_phoneme_dict (Dict[str, Dict[str, str]], optional): Word-phoneme dictionary for each language.
+          prefer_scripted (bool): Whether to load the TorchScript export of the checkpoint (see scripted_path)
+               when there is one, falling back to the eager model if it is missing, fails to load or was
+               exported from another version of the checkpoint. The export copies the weights into every
+               process, unlike a memory mapped safetensors checkpoint. (Default value = False)
+          lexicons (Dict[str, Lexicon], optional): External memory-mapped lexicon for each language.
 
         Returns:
           Phonemizer: Phonemizer object carrying the loaded model and, optionally, a phoneme dictionary.
         """
 
-        model, checkpoint = load_checkpoint(checkpoint_path, device=device)
+        logger = get_logger(__name__)
+        model, checkpoint = None, None
+        exported_path = scripted_path(checkpoint_path)
+        if prefer_scripted and os.path.exists(exported_path):
+            try:
+                model, checkpoint = load_scripted_checkpoint(exported_path,
+                                                             device=device,
+                                                             source_digest=checkpoint_digest(checkpoint_path))
+            except RuntimeError as e:
+                logger.warning(f'Could not load {exported_path}, falling back to the eager model: {e}')
+        if model is None:
+            model, checkpoint = load_checkpoint(checkpoint_path, device=device)
         applied_phoneme_dict = None
         if lang_phoneme_dict is not None:
             applied_phoneme_dict = lang_phoneme_dict
@@ -207,8 +270,8 @@ class Phonemizer:
             applied_phoneme_dict = checkpoint['phoneme_dict']
         preprocessor = checkpoint['preprocessor']
         predictor = Predictor(model=model, preprocessor=preprocessor)
-        logger = get_logger(__name__)
         model_step = checkpoint['step']
         logger.debug(f'Initializing phonemizer with model step {model_step}')
         return Phonemizer(predictor=predictor,
-                          lang_phoneme_dict=applied_phoneme_dict)
+                          lang_phoneme_dict=applied_phoneme_dict,
+                          lexicons=lexicons)
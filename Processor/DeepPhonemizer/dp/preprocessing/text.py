@@ -1,4 +1,6 @@
-from typing import List, Iterable, Dict, Tuple, Any
+from typing import List, Iterable, Dict, Tuple, Any, Optional, Union
+
+import torch
 
 
 class LanguageTokenizer:
@@ -45,6 +47,37 @@ class LanguageTokenizer:
         """
         return self.index_lang[index]
 
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns the constructor arguments of the tokenizer as a json serializable dictionary."""
+
+        return {'languages': [self.index_lang[i] for i in range(len(self.index_lang))]}
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> 'LanguageTokenizer':
+        """Initializes a language tokenizer from the dictionary returned by to_dict."""
+
+        return LanguageTokenizer(state['languages'])
+
+
+class _EncodingTable(dict):
+
+    """str.translate table mapping each character to its (repeated) token index stored as a code point,
+    or dropping it if it has no token. Filled lazily per code point, as the input alphabet is open-ended."""
+
+    def __init__(self, token_to_idx: Dict[str, int], char_repeats: int, lowercase: bool) -> None:
+        super().__init__()
+        self.token_to_idx = token_to_idx
+        self.char_repeats = char_repeats
+        self.lowercase = lowercase
+
+    def __missing__(self, code_point: int) -> Optional[str]:
+        char = chr(code_point)
+        char = char.lower() if self.lowercase else char
+        index = self.token_to_idx.get(char)
+        encoded = chr(index) * self.char_repeats if index is not None else None
+        self[code_point] = encoded
+        return encoded
+
 
 class SequenceTokenizer:
 
@@ -90,6 +123,25 @@ class SequenceTokenizer:
             self.token_to_idx[symbol] = len(self.token_to_idx)
         self.idx_to_token = {i: s for s, i in self.token_to_idx.items()}
         self.vocab_size = len(self.idx_to_token)
+        self._build_tables()
+
+    def _build_tables(self) -> None:
+        # dense lookup tables for the batch methods, token indices are stored as code points while encoding
+        self._tokens = [self.idx_to_token.get(i) for i in range(max(self.idx_to_token) + 1)]
+        self._special_indices = {i for i, token in self.idx_to_token.items() if token in self.special_tokens}
+        self._encoding_table = _EncodingTable(self.token_to_idx, self.char_repeats, self.lowercase)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # the tables are derived, so checkpoints keep the attributes of the original tokenizer only
+        state = self.__dict__.copy()
+        for name in ('_tokens', '_special_indices', '_encoding_table'):
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        # tokenizers pickled into .pt checkpoints are restored without __init__
+        self.__dict__.update(state)
+        self._build_tables()
 
     def __call__(self, sentence: Iterable[str], language: str) -> List[int]:
         """
@@ -135,6 +187,85 @@ class SequenceTokenizer:
             decoded = [d for d in decoded if d not in self.special_tokens]
         return decoded
 
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns the constructor arguments of the tokenizer as a json serializable dictionary.
+        The symbols are listed in index order, so from_dict rebuilds the exact same token indices."""
+
+        return {'symbols': [self.idx_to_token[i] for i in range(self.end_index + 1, self.vocab_size)],
+                'languages': list(self.languages),
+                'char_repeats': self.char_repeats,
+                'lowercase': self.lowercase,
+                'append_start_end': self.append_start_end,
+                'pad_token': self.idx_to_token[self.pad_index],
+                'end_token': self.idx_to_token[self.end_index]}
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> 'SequenceTokenizer':
+        """Initializes a sequence tokenizer from the dictionary returned by to_dict."""
+
+        return SequenceTokenizer(**state)
+
+    def encode_batch(self, sentences: List[str], language: str) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        """
+        Batched __call__ for words given as strings: maps every word through a lookup table in one pass
+        and returns them as a single padded tensor.
+
+        Args:
+          sentences (List[str]): Words (or sentences) to encode.
+          language (str): Language for the mapping that defines the start and end token indices.
+
+        Returns:
+          Tuple: The padded token indices (N x T LongTensor), the length of each sequence (LongTensor)
+                 and a mask of the sequences without any non-special token (BoolTensor).
+        """
+
+        if language not in self.languages:
+            raise ValueError(f'Language not supported: {language}. Supported languages: {self.languages}')
+        encoded = [sentence.translate(self._encoding_table) for sentence in sentences]
+        empty = torch.tensor([len(sequence) == 0 for sequence in encoded], dtype=torch.bool)
+        if self.append_start_end:
+            start, end = chr(self.get_start_index(language)), chr(self.end_index)
+            encoded = [start + sequence + end for sequence in encoded]
+        lengths = [len(sequence) for sequence in encoded]
+        max_len = max(lengths, default=0)
+        padded = ''.join(sequence + chr(self.pad_index) * (max_len - len(sequence)) for sequence in encoded)
+        if len(padded) == 0:
+            tokens = torch.zeros((len(sentences), max_len), dtype=torch.long)
+        else:
+            tokens = torch.frombuffer(bytearray(padded.encode('utf-32-le')), dtype=torch.int32) \
+                .view(len(sentences), max_len).long()
+        return tokens, torch.tensor(lengths, dtype=torch.long), empty
+
+    def decode_batch(self,
+                     sequences: Union[torch.Tensor, List[List[int]]],
+                     lengths: Optional[List[int]] = None,
+                     remove_special_tokens: bool = False) -> List[List[str]]:
+        """Batched decode: converts the whole batch to python ints once and decodes it with a lookup table.
+
+        Args:
+          sequences (Union[torch.Tensor, List[List[int]]]): Encoded sequences, padded (N x T) or as lists.
+          lengths (List[int], optional): Length of each sequence, the rest of a row is ignored. (Default value = None)
+          remove_special_tokens (bool): Whether to remove special tokens such as pad or start and end tokens. (Default value = False)
+
+        Returns:
+           List[List[str]]: Decoded sequences of symbols.
+        """
+
+        rows = sequences.tolist() if isinstance(sequences, torch.Tensor) else sequences
+        if lengths is not None:
+            rows = [row[:length] for row, length in zip(rows, lengths)]
+        tokens, special = self._tokens, self._special_indices
+        decoded = []
+        for row in rows:
+            if self.append_start_end:
+                row = row[:1] + row[1:-1:self.char_repeats] + row[-1:]
+            else:
+                row = row[::self.char_repeats]
+            decoded.append([tokens[t] for t in row
+                            if 0 <= t < len(tokens) and tokens[t] is not None
+                            and not (remove_special_tokens and t in special)])
+        return decoded
+
     def get_start_index(self, language: str) -> int:
         lang_token = self._make_start_token(language)
         return self.token_to_idx[lang_token]
@@ -213,3 +344,26 @@ class Preprocessor:
         return Preprocessor(lang_tokenizer=lang_tokenizer,
                             text_tokenizer=text_tokenizer,
                             phoneme_tokenizer=phoneme_tokenizer)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns the state of the preprocessor as a json serializable dictionary,
+        so that it can be stored next to the model weights instead of being pickled."""
+
+        return {'lang_tokenizer': self.lang_tokenizer.to_dict(),
+                'text_tokenizer': self.text_tokenizer.to_dict(),
+                'phoneme_tokenizer': self.phoneme_tokenizer.to_dict()}
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> 'Preprocessor':
+        """Initializes a preprocessor from the dictionary returned by to_dict.
+
+        Args:
+          state (Dict[str, Any]): Dictionary returned by to_dict.
+
+        Returns:
+          Preprocessor: Preprocessor object.
+        """
+
+        return Preprocessor(lang_tokenizer=LanguageTokenizer.from_dict(state['lang_tokenizer']),
+                            text_tokenizer=SequenceTokenizer.from_dict(state['text_tokenizer']),
+                            phoneme_tokenizer=SequenceTokenizer.from_dict(state['phoneme_tokenizer']))
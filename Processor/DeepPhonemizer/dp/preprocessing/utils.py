@@ -19,3 +19,26 @@ def batchify(input_batch: List[Any], batch_size: int) -> List[List[Any]]:
         output.append(batch)
     return output
 
+
+def batchify_by_length(input_batch: List[Any],
+                       lengths: List[int],
+                       batch_size: int,
+                       max_tokens: Union[None, int] = None) -> List[List[Any]]:
+    """
+    Splits inputs that are sorted by ascending length into batches of similar length.
+    A batch is closed once it holds batch_size items or once adding the next item would
+    make the padded batch (items * longest length) exceed max_tokens.
+    """
+
+    output, batch, batch_len = [], [], 0
+    for item, length in zip(input_batch, lengths):
+        new_len = max(batch_len, length)
+        too_many_tokens = max_tokens is not None and (len(batch) + 1) * new_len > max_tokens
+        if len(batch) > 0 and (len(batch) >= batch_size or too_many_tokens):
+            output.append(batch)
+            batch, new_len = [], length
+        batch.append(item)
+        batch_len = new_len
+    if len(batch) > 0:
+        output.append(batch)
+    return output
@@ -6,6 +6,9 @@ class Prediction:
     Container for single word prediction result.
     """
 
+    # one of these is allocated for every predicted word, slots keep them small
+    __slots__ = ('word', 'phonemes', 'phoneme_tokens', 'confidence', 'token_probs')
+
     def __init__(self,
                  word: str,
                  phonemes: str,
@@ -35,6 +38,8 @@ class PhonemizerResult:
     Container for phonemizer output.
     """
 
+    __slots__ = ('text', 'phonemes', 'split_text', 'split_phonemes', 'predictions')
+
     def __init__(self,
                  text: List[str],
                  phonemes: List[str],
@@ -49,7 +54,8 @@ class PhonemizerResult:
           phonemes (List[str]): List of output phonemes.
           split_text (List[List[str]]): List of texts, where each text is split into words and special chars.
           split_phonemes (List[List[str]]): List of phonemes corresponding to split_text.
-          predictions (Dict[str, Prediction]): Dictionary with entries word to Tuple (phoneme, probability).
+          predictions (Dict[str, Prediction]): Dictionary with entries word to Tuple (phoneme, probability),
+                                               empty when phonemizing with phonemes_only.
         """
 
         self.text = text
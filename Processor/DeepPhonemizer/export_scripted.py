@@ -0,0 +1,30 @@
+import argparse
+import os
+
+from expose_deep_phonemizer_module import expose_dp
+from Processor.DeepPhonemizer.grapheme2phoneme_converter import Grapheme2PhonemeConverter
+from Processor.Domain.supported_language import SupportedLanguage
+
+expose_dp()
+
+from Processor.DeepPhonemizer.dp.model.model import checkpoint_digest, load_checkpoint, save_scripted_checkpoint, \
+    scripted_path
+
+if __name__ == "__main__":
+    # Exports the G2P checkpoints with TorchScript to best_<lang>_model.scripted.pt, preprocessor tables included.
+    # It is only used by a Grapheme2PhonemeConverter built with prefer_scripted=True, and only as long as the
+    # checkpoint it was exported from is unchanged: the memory mapped checkpoint is shared by worker processes,
+    # while every process loading the export holds its own copy of the weights.
+    parser = argparse.ArgumentParser(description="Exports the G2P checkpoints with TorchScript.")
+    parser.add_argument("--models_dir", default="./Processor/DeepPhonemizer/g2p_latin_models/")
+    parser.add_argument("--languages", nargs="+", default=[str(lang) for lang in SupportedLanguage],
+                        choices=[str(lang) for lang in SupportedLanguage])
+    args = parser.parse_args()
+
+    for lang in [SupportedLanguage(code) for code in args.languages]:
+        source = Grapheme2PhonemeConverter.checkpoint_path(lang, os.path.join(args.models_dir, ""))
+        target = scripted_path(source)
+        print(f"Exporting {source} ... ")
+        model, checkpoint = load_checkpoint(source, device="cpu")
+        save_scripted_checkpoint(model, checkpoint, target, checkpoint_digest(source))
+        print(f"Wrote {target}!")
@@ -1,25 +1,57 @@
+import os
 import torch
 import warnings
 
+from Processor.Domain.precision_mode import PrecisionMode
 from Processor.Domain.supported_language import SupportedLanguage
+from Processor.DeepPhonemizer.dp.lexicon import Lexicon
 from Processor.DeepPhonemizer.dp.phonemizer import Phonemizer
 
 
 class Grapheme2PhonemeConverter:
     def __init__(self,
                  language: SupportedLanguage,
-                 path_prefix: str = "./g2p_latin_models/"):
+                 path_prefix: str = "./g2p_latin_models/",
+                 batch_size: int = 64,
+                 max_tokens_per_batch: int | None = 16_384,
+                 precision: PrecisionMode = PrecisionMode.Float32,
+                 prefer_scripted: bool = False):
         print(f"Loading G2P for {language} ... ")
         self.language = language
+        self.batch_size = batch_size
+        self.max_tokens_per_batch = max_tokens_per_batch
+        self.precision = precision
         device = "cuda" if torch.cuda.is_available() else "cpu"
         warnings.filterwarnings("ignore",
                                 message="enable_nested_tensor is True, but self.use_nested_tensor is False*",
                                 category=UserWarning)
-        self.model = Phonemizer.from_checkpoint(path_prefix + language.to_best_model(),
-                                                device=device)
+        # the TorchScript export is opt-in, as it is not memory mapped like the safetensors checkpoint.
+        # Dynamic quantization needs the eager modules, a TorchScript export cannot be quantized afterwards
+        prefer_scripted = prefer_scripted and precision != PrecisionMode.DynamicInt8
+        self.model = Phonemizer.from_checkpoint(self.checkpoint_path(language, path_prefix),
+                                                device=device,
+                                                prefer_scripted=prefer_scripted,
+                                                lexicons=self.__lexicons(language, path_prefix))
+        self.model.predictor.model = precision.apply(self.model.predictor.model, device)
         warnings.resetwarnings()
-        print(f"Loaded G2P for {language}! ")
+        print(f"Loaded G2P for {language} ({precision})! ")
+
+    @staticmethod
+    def checkpoint_path(language: SupportedLanguage, path_prefix: str) -> str:
+        # the memory mapped safetensors export is shared between processes, the .pt checkpoint is not
+        weights = path_prefix + language.to_best_weights()
+        return weights if os.path.exists(weights) else path_prefix + language.to_best_model()
+
+    @staticmethod
+    def __lexicons(language: SupportedLanguage, path_prefix: str) -> dict[str, Lexicon]:
+        # words found in the lexicon built by build_lexicon never reach the model
+        path = path_prefix + language.to_lexicon()
+        return {str(language): Lexicon(path)} if os.path.exists(path) else {}
 
     def __call__(self, words: list[str]) -> list[str]:
-        result = self.model(words, lang=str(self.language))
-        return result if isinstance(result, list) else [result]
+        # only the phoneme strings are used, so no token/probability lists are built for the predictions
+        return self.model.phonemize_list(words,
+                                         lang=str(self.language),
+                                         batch_size=self.batch_size,
+                                         max_tokens_per_batch=self.max_tokens_per_batch,
+                                         phonemes_only=True).phonemes
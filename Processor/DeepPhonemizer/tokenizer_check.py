@@ -0,0 +1,57 @@
+import argparse
+import os
+import pickle
+import sys
+
+from expose_deep_phonemizer_module import expose_dp
+from Processor.Domain.supported_language import SupportedLanguage
+
+expose_dp()
+
+from Processor.DeepPhonemizer.dp.model.model import load_checkpoint
+from Processor.DeepPhonemizer.dp.preprocessing.text import SequenceTokenizer
+
+Words = ["ciao", "Giorgio", "niño", "cigüeña", "xilófono", "", "123", "l'acqua"]
+
+
+def check(name: str, tokenizer: SequenceTokenizer, language: str) -> list[str]:
+    # the batch methods must agree with the per-word __call__ and decode they replace
+    failures = []
+    tokens, lengths, _ = tokenizer.encode_batch(Words, language)
+    for word, row, length in zip(Words, tokens.tolist(), lengths.tolist()):
+        if row[:length] != tokenizer(word, language):
+            failures.append(f"{name}: encode_batch disagrees with __call__ on '{word}'")
+    decoded = tokenizer.decode_batch(tokens, lengths.tolist(), remove_special_tokens=True)
+    for word, row, length, symbols in zip(Words, tokens.tolist(), lengths.tolist(), decoded):
+        if symbols != tokenizer.decode(row[:length], remove_special_tokens=True):
+            failures.append(f"{name}: decode_batch disagrees with decode on '{word}'")
+    return failures
+
+
+if __name__ == "__main__":
+    # Checks that tokenizers restored by unpickling, as the ones stored in .pt checkpoints, can still encode
+    # and decode batches: unpickling skips __init__, where the lookup tables of the batch methods are built.
+    # Exits with 1 on any failure.
+    parser = argparse.ArgumentParser(description="Checks the batch methods of unpickled G2P tokenizers.")
+    parser.add_argument("--models_dir", default="./Processor/DeepPhonemizer/g2p_latin_models/")
+    args = parser.parse_args()
+
+    tokenizer = SequenceTokenizer(symbols=list("abcdefghijklmnopqrstuvwxyzñüó'"),
+                                  languages=["it", "es"],
+                                  char_repeats=3)
+    failures = check("pickled tokenizer", pickle.loads(pickle.dumps(tokenizer)), "it")
+
+    for lang in SupportedLanguage:
+        path = os.path.join(args.models_dir, lang.to_best_model())
+        if not os.path.exists(path):
+            print(f"Skipping {path}, not found.")
+            continue
+        _, checkpoint = load_checkpoint(path, device="cpu")
+        preprocessor = checkpoint["preprocessor"]
+        failures += check(f"{path} text tokenizer", preprocessor.text_tokenizer, str(lang))
+        failures += check(f"{path} phoneme tokenizer", preprocessor.phoneme_tokenizer, str(lang))
+
+    for failure in failures:
+        print(failure)
+    print("All tokenizers agree." if len(failures) == 0 else f"{len(failures)} failures.")
+    sys.exit(0 if len(failures) == 0 else 1)
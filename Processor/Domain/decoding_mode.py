@@ -0,0 +1,10 @@
+from enum import Enum
+
+class DecodingMode(Enum):
+    # generation config shipped with the checkpoint and a fixed max_length
+    Checkpoint = 'checkpoint'
+    # greedy search with KV cache, stopping on EOS and a max_length derived from the input
+    Greedy = 'greedy'
+
+    def __str__(self):
+        return self.value
@@ -0,0 +1,31 @@
+from enum import Enum
+
+
+class PrecisionMode(Enum):
+    Float32 = 'fp32'
+    # int8 weights for every Linear layer, activations quantized on the fly; cpu only
+    DynamicInt8 = 'int8'
+    # only faster on hardware with native bfloat16 support (recent Xeons, Ampere+ GPUs)
+    BFloat16 = 'bf16'
+
+    def apply(self, model, device: str):
+        import torch
+
+        match self:
+            case PrecisionMode.Float32:
+                return model
+            case PrecisionMode.DynamicInt8:
+                if device != "cpu":
+                    print(f"Dynamic int8 quantization only runs on cpu, keeping {device} in fp32.")
+                    return model
+                return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+            case PrecisionMode.BFloat16:
+                if device == "cuda" and not torch.cuda.is_bf16_supported():
+                    print("This GPU does not support bfloat16, keeping it in fp32.")
+                    return model
+                return model.to(torch.bfloat16)
+            case _:
+                assert False
+
+    def __str__(self):
+        return self.value
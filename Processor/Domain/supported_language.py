@@ -7,5 +7,11 @@ class SupportedLanguage(Enum):
     def to_best_model(self) -> str:
         return f'best_{self}_model.pt'
 
+    def to_best_weights(self) -> str:
+        return f'best_{self}_model.safetensors'
+
+    def to_lexicon(self) -> str:
+        return f'{self}_lexicon.idx'
+
     def __str__(self):
         return self.value
\ No newline at end of file
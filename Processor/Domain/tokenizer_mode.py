@@ -0,0 +1,12 @@
+from enum import Enum
+
+class TokenizerMode(Enum):
+    # the whole trained pipeline (tagger, parser, NER, transformer, ...)
+    Full = 'full'
+    # the trained pipeline's tokenizer, every other component is excluded when loading
+    TokenizerOnly = 'tokenizer_only'
+    # the language's default tokenizer rules, no trained pipeline needed
+    Blank = 'blank'
+
+    def __str__(self):
+        return self.value
@@ -1,38 +1,48 @@
+import re
+
 from Processor.Domain.supported_language import SupportedLanguage
 from Processor.PhonemeMapper.italian_phoneme_mapper import ItalianPhonemeMapper
 from Processor.PhonemeMapper.spanish_phoneme_mapper import SpanishPhonemeMapper
 
 
+class CompiledPhonemeMapper:
+    def __init__(self, mapper):
+        self.table = mapper.dict()
+        # mapper.keys() is sorted longest first, and regex alternation takes the
+        # first branch that matches, so this is a longest-match scan.
+        # Spaces are skipped, anything else is reported and dropped.
+        self.pattern = re.compile(
+            "(" + "|".join(re.escape(key) for key in mapper.keys()) + ")|( )|(.)",
+            re.DOTALL)
+
+    def __replace(self, match: re.Match) -> str:
+        key, _, unknown = match.groups()
+        if key is not None:
+            return self.table[key]
+        if unknown is not None:
+            print(f"Unrecognized phoneme sequence at position {match.start()}: '{match.string[match.start():]}'")
+        return ""
+
+    def __call__(self, phoneme: str) -> str:
+        return self.pattern.sub(self.__replace, phoneme)
 
-class PhonemeMap:
-    @classmethod
-    def __get_mapper(cls, language: SupportedLanguage):
-        match language:
-            case SupportedLanguage.Italian:
-                return ItalianPhonemeMapper
-            case SupportedLanguage.Spanish:
-                return SpanishPhonemeMapper
-        return None
 
+_compiled_mappers = {
+    SupportedLanguage.Italian: CompiledPhonemeMapper(ItalianPhonemeMapper),
+    SupportedLanguage.Spanish: CompiledPhonemeMapper(SpanishPhonemeMapper),
+}
+
+
+class PhonemeMap:
     @classmethod
     def apply(cls, language: SupportedLanguage, phoneme: str | list[str]) -> str | list[str]:
         if isinstance(phoneme, list):
-            return [cls.apply(language, p) for p in phoneme]
-        i = 0
-        mapper = cls.__get_mapper(language)
-        result = []
-        while i < len(phoneme):
-            if phoneme[i] == " ":
-                i += 1
-                continue
-            matched = False
-            for key in mapper.keys():
-                if phoneme[i:i + len(key)] == key:
-                    result.append(mapper.dict()[key])
-                    i += len(key)
-                    matched = True
-                    break
-            if not matched:
-                print(f"Unrecognized phoneme sequence at position {i}: '{phoneme[i:]}'")
-                i += 1
-        return ''.join(result)
\ No newline at end of file
+            return cls.apply_many(language, phoneme)
+        return _compiled_mappers[language](phoneme)
+
+    @classmethod
+    def apply_many(cls, language: SupportedLanguage, phonemes: list[str]) -> list[str]:
+        mapper = _compiled_mappers[language]
+        # the same phoneme string is mapped once per call
+        mapped = {phoneme: mapper(phoneme) for phoneme in dict.fromkeys(phonemes)}
+        return [mapped[phoneme] for phoneme in phonemes]
@@ -2,48 +2,84 @@ import re
 from spacy.tokens import Doc
 
 class Reconstructor:
+    WordPattern = re.compile(r"^\w+$")
+    # Replace apostrophes between two word characters (elision) with hyphen
+    # In Italian and Spanish we have constructs like:
+    # l'avevo
+    # And we would like to turn it to a more Romanian-like:
+    # l-avevo
+    __Elision = r"(?P<elision>(?<=\w)'(?=\w))"
+    # Delete punctuations marks that do not exist in Romanian, together with the whitespace run they sit in
+    __Inverted = r"(?P<inverted>\s*[¿¡] ?(?:\s|[¿¡] ?)*)"
+    # Remove whitespace before . , ! ?
+    __SpaceBeforePunctuation = r"(?P<space>\s+(?=[.,!?]))"
+    __Normalization = re.compile(f"{__Elision}|{__Inverted}|{__SpaceBeforePunctuation}")
+    __InvertedMark = re.compile(r"[¿¡] ?")
+    __Punctuation = (".", ",", "!", "?")
+
     @classmethod
     def normalize_apostrophes(cls, text: str) -> str:
-        # Replace apostrophes between two word characters (elision) with hyphen
-        # In Italian and Spanish we have constructs like:
-        # l'avevo 
-        # And we would like to turn it to a more Romanian-like:
-        # l-avevo
-        text = re.sub(r"(?<=\w)'(?=\w)", "-", text)
-
-        return text
+        return re.sub(r"(?<=\w)'(?=\w)", "-", text)
 
     @classmethod
     def normalize_punctuation(cls, text: str) -> str:
-        # Delete punctuations marks that do not exist in Romanian
         text = re.sub(r"(¿|¡) ?", "", text)
-    
-        text = re.sub(r"\s+(\.|,|!|\?)", r"\1", text)
+        return re.sub(r"\s+(\.|,|!|\?)", r"\1", text)
 
-        return text
+    @classmethod
+    def __normalize_match(cls, match: re.Match) -> str:
+        match match.lastgroup:
+            case "elision":
+                return "-"
+            case "space":
+                return ""
+            case "inverted":
+                # whatever whitespace is left once the marks are gone still disappears before punctuation
+                if match.string[match.end():match.end() + 1] in cls.__Punctuation:
+                    return ""
+                return cls.__InvertedMark.sub("", match.group(0))
+            case _:
+                # kept out of an assert, which -O strips, so a new group without a case fails loudly
+                raise ValueError(f"Unexpected normalization match: {match.lastgroup}")
 
     @classmethod
     def normalize(cls, text: str) -> str:
-        return cls.normalize_punctuation(
-                    cls.normalize_apostrophes(
-                        text
-                    )
-                )
-    
+        # same result as normalize_punctuation(normalize_apostrophes(text)), in a single pass
+        return cls.__Normalization.sub(cls.__normalize_match, text)
+
     @classmethod
-    def apply(cls, base_doc: Doc, graphemes: list[str]) -> str:
+    def word_mask(cls, doc: Doc) -> list[bool]:
+        # the tokens that are transliterated, computed once per doc and shared with Pipeline
+        is_word = cls.WordPattern.match
+        return [is_word(token.text) is not None for token in doc]
+
+    @classmethod
+    def apply(cls, base_doc: Doc, graphemes: list[str], word_mask: list[bool] | None = None) -> str:
+        if word_mask is None:
+            word_mask = cls.word_mask(base_doc)
         out_words = []
         grapheme_iter = iter(graphemes)
-        for token in base_doc:
-            if re.match(r"^\w+$", token.text):
+        for token, is_word in zip(base_doc, word_mask):
+            text = token.text
+            if is_word:
                 new_word = next(grapheme_iter)
 
-                if token.text.istitle():
+                if text.istitle():
                     new_word = new_word.capitalize()
-                elif token.text.isupper():
+                elif text.isupper():
                     new_word = new_word.upper()
                 out_words.append(new_word + token.whitespace_)
             else:
-                out_words.append(token.text + token.whitespace_)
+                out_words.append(text + token.whitespace_)
 
-        return cls.normalize("".join(out_words))
\ No newline at end of file
+        return cls.normalize("".join(out_words))
+
+    @classmethod
+    def apply_many(cls,
+                   docs: list[Doc],
+                   graphemes_per_doc: list[list[str]],
+                   word_masks: list[list[bool]] | None = None) -> list[str]:
+        if word_masks is None:
+            word_masks = [cls.word_mask(doc) for doc in docs]
+        return [cls.apply(doc, graphemes, word_mask)
+                for doc, graphemes, word_mask in zip(docs, graphemes_per_doc, word_masks)]
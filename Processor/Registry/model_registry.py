@@ -0,0 +1,41 @@
+import threading
+from typing import Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class ModelRegistry:
+    # Heavy resources (spaCy models, G2P checkpoints, the P2G model) are built by their factory
+    # on first use and shared afterward, so importing Processor does not load anything.
+    def __init__(self):
+        self.__resources: dict[Hashable, object] = {}
+        self.__locks: dict[Hashable, threading.Lock] = {}
+        self.__lock = threading.Lock()
+
+    def get(self, key: Hashable, factory: Callable[[], T]) -> T:
+        resource = self.__resources.get(key)
+        if resource is not None:
+            return resource
+        with self.__lock:
+            key_lock = self.__locks.setdefault(key, threading.Lock())
+        # one lock per key: concurrent callers of the same resource wait for a single load,
+        # while different resources still load in parallel
+        with key_lock:
+            resource = self.__resources.get(key)
+            if resource is None:
+                resource = factory()
+                self.__resources[key] = resource
+        return resource
+
+    def is_loaded(self, key: Hashable) -> bool:
+        return key in self.__resources
+
+    def loaded(self) -> list[Hashable]:
+        return list(self.__resources.keys())
+
+    def evict(self, key: Hashable):
+        with self.__lock:
+            self.__resources.pop(key, None)
+
+
+models = ModelRegistry()
@@ -0,0 +1,65 @@
+import argparse
+import sys
+
+from Processor.Domain.supported_language import SupportedLanguage
+from Processor.Domain.tokenizer_mode import TokenizerMode
+from Processor.Tokenizer.tokenizer import load_model
+
+SampleSentences = {
+    SupportedLanguage.Italian: [
+        "Nel mezzo del cammin di nostra vita mi ritrovai per una selva oscura,",
+        "ché la diritta via era smarrita.",
+        "Tant' è amara che poco è più morte;",
+        "ma per trattar del ben ch'i' vi trovai, dirò de l'altre cose ch'i' v'ho scorte.",
+        "L'avevo detto: all'inizio c'era un po' di confusione, no?",
+        "Il 3 maggio 2021 il Prof. Rossi ha visitato l'U.E. a Bruxelles.",
+        "«Dove vai?» chiese Maria - alle 10:30, non più tardi!",
+        "Quell'uomo, dall'aria stanca, è arrivato nell'ultimo treno.",
+    ],
+    SupportedLanguage.Spanish: [
+        "Desocupado Lector: sin juramento me podrás creer que quisiera que este libro,",
+        "como hijo del entendimiento, fuera el más hermoso, el más gallardo y más discreto.",
+        "Y así, ¿qué podrá engendrar el estéril y mal cultivado ingenio mío?",
+        "¡Qué alegría verte! Dímelo ya, por favor.",
+        "El Sr. García llegó el 3 de mayo de 2021 a las 10:30 a EE.UU.",
+        "«No sé», respondió ella - y se fue del lugar sin decir nada más.",
+        "Del dicho al hecho hay mucho trecho, ¿no crees?",
+        "Los niños juegan en el parque mientras sus padres conversan.",
+    ],
+}
+
+
+def token_boundaries(model, sentences: list[str]) -> list[list[tuple[str, str]]]:
+    return [[(token.text, token.whitespace_) for token in doc] for doc in model.pipe(sentences)]
+
+
+if __name__ == "__main__":
+    # Checks that the lightweight tokenizer modes split a corpus sample exactly like the full pipelines,
+    # which is all Pipeline and Reconstructor rely on. Exits with 1 on any difference.
+    parser = argparse.ArgumentParser(description="Compares token boundaries of the tokenizer modes.")
+    parser.add_argument("--corpus", default=None,
+                        help="File with one sentence per line, used for every language instead of the built-in sample")
+    parser.add_argument("--modes", nargs="+", default=[str(TokenizerMode.TokenizerOnly)],
+                        choices=[str(mode) for mode in TokenizerMode if mode != TokenizerMode.Full])
+    args = parser.parse_args()
+
+    mismatches = 0
+    for lang in SupportedLanguage:
+        if args.corpus is not None:
+            with open(args.corpus, "r", encoding="utf-8") as f:
+                sentences = [line.rstrip("\n") for line in f if line.strip()]
+        else:
+            sentences = SampleSentences[lang]
+        reference = token_boundaries(load_model(lang, TokenizerMode.Full), sentences)
+        for mode in args.modes:
+            candidate = token_boundaries(load_model(lang, TokenizerMode(mode)), sentences)
+            for sentence, expected, actual in zip(sentences, reference, candidate):
+                if expected != actual:
+                    mismatches += 1
+                    print(f"[{lang}][{mode}] Token boundaries differ for: {sentence}")
+                    print(f"    {TokenizerMode.Full}: {[text for text, _ in expected]}")
+                    print(f"    {mode}: {[text for text, _ in actual]}")
+            print(f"[{lang}][{mode}] Checked {len(sentences)} sentences.")
+
+    print("Token boundaries are identical." if mismatches == 0 else f"{mismatches} sentences differ.")
+    sys.exit(0 if mismatches == 0 else 1)
@@ -1,18 +1,68 @@
 import spacy
 from spacy.tokens import Doc
 from Processor.Domain.supported_language import SupportedLanguage
+from Processor.Domain.tokenizer_mode import TokenizerMode
+from Processor.Registry.model_registry import models
+
+
+# Pipeline and Reconstructor only read token.text and token.whitespace_,
+# so by default nothing but the tokenizer of the trained pipelines is loaded and run
+_model_names = {
+    SupportedLanguage.Italian: "it_core_news_lg",
+    SupportedLanguage.Spanish: "es_dep_news_trf",
+}
+_blank_codes = {
+    SupportedLanguage.Italian: "it",
+    SupportedLanguage.Spanish: "es",
+}
+
+
+def load_model(lang: SupportedLanguage, mode: TokenizerMode):
+    match mode:
+        case TokenizerMode.Full:
+            return spacy.load(_model_names[lang])
+        case TokenizerMode.TokenizerOnly:
+            package_path = spacy.util.get_package_path(_model_names[lang])
+            # "pipeline" lists the enabled components only, the disabled ones would still be loaded
+            components = spacy.util.get_model_meta(package_path)["components"]
+            return spacy.load(_model_names[lang], exclude=components)
+        case TokenizerMode.Blank:
+            return spacy.blank(_blank_codes[lang])
+        case _:
+            assert False
 
 
 class Tokenizer:
-    _italian = spacy.load("it_core_news_lg")
-    _spanish = spacy.load("es_dep_news_trf")
+    _modes = {
+        SupportedLanguage.Italian: TokenizerMode.TokenizerOnly,
+        SupportedLanguage.Spanish: TokenizerMode.TokenizerOnly,
+    }
+
+    @staticmethod
+    def set_mode(lang: SupportedLanguage, mode: TokenizerMode):
+        # the model for the new mode is loaded on the next use
+        models.evict(("spacy", lang, Tokenizer._modes[lang]))
+        Tokenizer._modes[lang] = mode
+
+    @staticmethod
+    def mode(lang: SupportedLanguage) -> TokenizerMode:
+        return Tokenizer._modes[lang]
+
+    @staticmethod
+    def _model(lang: SupportedLanguage):
+        mode = Tokenizer._modes[lang]
+        return models.get(("spacy", lang, mode), lambda: load_model(lang, mode))
+
+    @staticmethod
+    def warmup(lang: SupportedLanguage):
+        Tokenizer._model(lang)
 
     @staticmethod
     def apply(lang: SupportedLanguage, text: str) -> Doc:
-        match lang:
-            case SupportedLanguage.Italian:
-                return Tokenizer._italian(text)
-            case SupportedLanguage.Spanish:
-                return Tokenizer._spanish(text)
-            case _:
-                assert False
\ No newline at end of file
+        return Tokenizer._model(lang)(text)
+
+    @staticmethod
+    def apply_many(lang: SupportedLanguage, texts: list[str], batch_size: int = 256) -> list[Doc]:
+        # nlp.pipe buffers the texts internally, which is much cheaper
+        # than calling the model once per sentence
+        return list(Tokenizer._model(lang).pipe(texts, batch_size=batch_size))
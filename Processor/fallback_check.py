@@ -0,0 +1,36 @@
+import sys
+import tempfile
+
+from Processor.Domain.precision_mode import PrecisionMode
+from Processor.Domain.supported_language import SupportedLanguage
+from Processor.pipeline import Pipeline
+from Processor.Registry.model_registry import models
+
+Sentence = "Ciao bella Roma"
+# the P2G fallback gives up on the first word and converts the other ones
+Graphemes = [None, "bela", "roma"]
+Expected = "Ciao bela Roma"
+
+
+if __name__ == "__main__":
+    # Checks that a word the models fail on is kept as written instead of failing the sentence,
+    # and that it is not cached. Stand-in models are registered in place of the real ones.
+    # Exits with 1 on any failure.
+    lang, precision = SupportedLanguage.Italian, PrecisionMode.Float32
+    models.get(("g2p", lang, precision), lambda: lambda words: [""] * len(words))
+    models.get(("p2g", precision), lambda: lambda phonemes: Graphemes[:len(phonemes)])
+
+    failures = []
+    with tempfile.TemporaryDirectory() as cache_dir:
+        pipeline = Pipeline(lang, cache_dir=cache_dir, precision=precision)
+        for name, converted in [("__call__", pipeline(Sentence)), ("batch", pipeline.batch([Sentence])[0])]:
+            if converted != Expected:
+                failures.append(f"{name} returned '{converted}' instead of '{Expected}'")
+        if "Ciao" in pipeline.cache.get_many(["Ciao"]):
+            failures.append("the failed word was cached")
+        pipeline.cache.close()
+
+    for failure in failures:
+        print(failure)
+    print("Failed words are kept as written." if len(failures) == 0 else f"{len(failures)} failures.")
+    sys.exit(0 if len(failures) == 0 else 1)
@@ -0,0 +1,58 @@
+import argparse
+import json
+import subprocess
+import sys
+
+# runs in a fresh interpreter, so nothing imported by this script skews the measurement.
+# spaCy imports torch on its own whenever it is installed, so instead of torch the check looks
+# for the modules of this repo that pull in the models
+_Probe = """
+import json, sys, tempfile, time
+start = time.perf_counter()
+import Processor.pipeline
+elapsed = time.perf_counter() - start
+from Processor.Domain.supported_language import SupportedLanguage
+from Processor.Registry.model_registry import models
+with tempfile.TemporaryDirectory() as cache_dir:
+    start = time.perf_counter()
+    Processor.pipeline.Pipeline(SupportedLanguage.Italian, cache_dir=cache_dir)
+    construction = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed,
+                  "construction_seconds": construction,
+                  "loaded": [str(key) for key in models.loaded()],
+                  "modules": [name for name in ("Processor.DeepPhonemizer.dp",
+                                                "Processor.DeepPhonemizer.grapheme2phoneme_converter",
+                                                "Processor.DeepGraphemizer.phoneme2grapheme_converter")
+                              if name in sys.modules]}))
+"""
+
+
+if __name__ == "__main__":
+    # Checks that importing Processor.pipeline and building a Pipeline stay cheap: they must not load
+    # any model or open the cache, must not import the converters and must finish within the budgets.
+    # Exits with 1 otherwise.
+    parser = argparse.ArgumentParser(description="Checks the import time of Processor.pipeline.")
+    parser.add_argument("--budget", type=float, default=3.0, help="Maximum import time in seconds")
+    parser.add_argument("--construction-budget", type=float, default=0.1,
+                        help="Maximum time to build a Pipeline in seconds")
+    args = parser.parse_args()
+
+    probe = subprocess.run([sys.executable, "-c", _Probe], capture_output=True, text=True, check=True)
+    report = json.loads(probe.stdout.strip().splitlines()[-1])
+
+    failures = []
+    if report["seconds"] > args.budget:
+        failures.append(f"import took {report['seconds']:.2f}s, over the {args.budget:.2f}s budget")
+    if report["construction_seconds"] > args.construction_budget:
+        failures.append(f"building a Pipeline took {report['construction_seconds']:.2f}s, "
+                        f"over the {args.construction_budget:.2f}s budget")
+    if len(report["loaded"]) > 0:
+        failures.append(f"models loaded before first use: {', '.join(report['loaded'])}")
+    if len(report["modules"]) > 0:
+        failures.append(f"heavy modules imported: {', '.join(report['modules'])}")
+
+    print(f"Imported Processor.pipeline in {report['seconds']:.2f}s, "
+          f"built a Pipeline in {report['construction_seconds']:.2f}s.")
+    for failure in failures:
+        print(failure)
+    sys.exit(0 if len(failures) == 0 else 1)
@@ -1,29 +1,141 @@
+from Processor.Cache.transliteration_cache import TransliterationCache
+from Processor.Domain.decoding_mode import DecodingMode
+from Processor.Domain.precision_mode import PrecisionMode
 from Processor.Domain.supported_language import SupportedLanguage
-from Processor.DeepPhonemizer.grapheme2phoneme_converter import \
-                             Grapheme2PhonemeConverter as g2pConverter
-from Processor.DeepGraphemizer.phoneme2grapheme_converter import \
-                             Phoneme2GraphemeConverter as p2gConverter
 from Processor.PhonemeMapper.mapper import PhonemeMap
 from Processor.Reconstructor.reconstructor import Reconstructor
+from Processor.Registry.model_registry import models
 from Processor.Tokenizer.tokenizer import Tokenizer
 
-import re
+import glob
+import os
+from spacy.tokens import Doc
+
+G2P_MODELS_DIR = "./Processor/DeepPhonemizer/g2p_latin_models/"
+P2G_MODEL_DIR = "./Processor/DeepGraphemizer/p2g_romanian_model"
+P2G_DECODING_MODE = DecodingMode.Greedy
+PHONEME_MAPPER_DIR = "./Processor/PhonemeMapper/"
+
+
+# the converters pull in torch, transformers and DeepPhonemizer, so they are only imported on first use
+def _load_g2p(lang: SupportedLanguage, precision: PrecisionMode):
+    from Processor.DeepPhonemizer.grapheme2phoneme_converter import Grapheme2PhonemeConverter
+    return Grapheme2PhonemeConverter(lang, G2P_MODELS_DIR, precision=precision)
+
+
+def _g2p_files(lang: SupportedLanguage) -> list[str]:
+    # whichever of the .pt checkpoint, its safetensors export (with the json sidecar),
+    # its TorchScript export and the lexicon are present
+    weights = G2P_MODELS_DIR + lang.to_best_weights()
+    candidates = [G2P_MODELS_DIR + lang.to_best_model(), weights, os.path.splitext(weights)[0] + ".json",
+                  os.path.splitext(weights)[0] + ".scripted.pt", G2P_MODELS_DIR + lang.to_lexicon()]
+    return [path for path in candidates if os.path.exists(path)]
+
+
+def _phoneme_map_files() -> list[str]:
+    # the mapping tables are code, editing them changes the transliterations just like new weights
+    return sorted(glob.glob(os.path.join(PHONEME_MAPPER_DIR, "*.py")))
+
+
+def _open_cache(lang: SupportedLanguage, cache_dir: str, precision: PrecisionMode) -> TransliterationCache:
+    return TransliterationCache(lang,
+                                _g2p_files(lang) + _phoneme_map_files() + [P2G_MODEL_DIR],
+                                cache_dir,
+                                model_variant=f"{precision}/{P2G_DECODING_MODE}")
+
+
+def _load_p2g(precision: PrecisionMode):
+    from Processor.DeepGraphemizer.phoneme2grapheme_converter import Phoneme2GraphemeConverter
+    return Phoneme2GraphemeConverter(P2G_MODEL_DIR, decoding_mode=P2G_DECODING_MODE, precision=precision)
 
-p2g = p2gConverter("./Processor/DeepGraphemizer/p2g_romanian_model")
-lang_2_g2p_map = {}
 
 class Pipeline:
-    def __init__(self, lang: SupportedLanguage):
+    def __init__(self,
+                 lang: SupportedLanguage,
+                 cache_dir: str | None = None,
+                 precision: PrecisionMode = PrecisionMode.Float32):
         self.lang = lang
-        if lang not in lang_2_g2p_map.keys():
-            lang_2_g2p_map[lang] = g2pConverter(lang, "./Processor/DeepPhonemizer/g2p_latin_models/")
-        self.g2p = lang_2_g2p_map[lang]
-        self.p2g = p2g
+        self.cache_dir = cache_dir
+        self.precision = precision
+
+    # opening the cache hashes every model file, so it is shared and opened on first use like the models
+    def __cache_key(self):
+        return "cache", self.lang, os.path.abspath(self.cache_dir), self.precision
+
+    @property
+    def cache(self) -> TransliterationCache | None:
+        if self.cache_dir is None:
+            return None
+        return models.get(self.__cache_key(), lambda: _open_cache(self.lang, self.cache_dir, self.precision))
+
+    def is_cache_open(self) -> bool:
+        return self.cache_dir is not None and models.is_loaded(self.__cache_key())
+
+    @property
+    def g2p(self):
+        return models.get(("g2p", self.lang, self.precision), lambda: _load_g2p(self.lang, self.precision))
+
+    @property
+    def p2g(self):
+        return models.get(("p2g", self.precision), lambda: _load_p2g(self.precision))
+
+    def warmup(self):
+        Tokenizer.warmup(self.lang)
+        self.cache
+        self.g2p
+        self.p2g
+
+    @staticmethod
+    def _word_tokens(doc: Doc, word_mask: list[bool]) -> list[str]:
+        return [token.text for token, is_word in zip(doc, word_mask) if is_word]
+
+    def _run_models(self, words: list[str]) -> list[str]:
+        phonemes = self.g2p(words)
+        ro_phonemes = PhonemeMap.apply(self.lang, phonemes)
+        return self.p2g(ro_phonemes)
+
+    @staticmethod
+    def _keep_failed(words: list[str], graphemes: list[str | None]) -> list[str]:
+        # a word the models failed on is kept as written instead of failing the whole batch
+        return [grapheme if grapheme is not None else word for word, grapheme in zip(words, graphemes)]
+
+    def _transliterate(self, words: list[str]) -> list[str]:
+        if self.cache is None:
+            return self._keep_failed(words, self._run_models(words))
+        graphemes = self.cache.get_many(words)
+        missing = [word for word in dict.fromkeys(words) if word not in graphemes]
+        if len(missing) > 0:
+            computed = dict(zip(missing, self._run_models(missing)))
+            # failed conversions are not cached so that they are retried next time
+            self.cache.put_many({word: grapheme for word, grapheme in computed.items() if grapheme is not None})
+            graphemes.update(computed)
+        return self._keep_failed(words, [graphemes[word] for word in words])
 
     def __call__(self, text: str) -> str:
         tokens = Tokenizer.apply(self.lang, text)
-        word_tokens = [token.text for token in tokens if re.match(r"^\w+$", token.text)]
-        phonemes = self.g2p(word_tokens)
-        ro_phonemes = PhonemeMap.apply(self.lang, phonemes)
-        graphemes = self.p2g(ro_phonemes)
-        return Reconstructor.apply(tokens, graphemes)
+        word_mask = Reconstructor.word_mask(tokens)
+        graphemes = self._transliterate(self._word_tokens(tokens, word_mask))
+        return Reconstructor.apply(tokens, graphemes, word_mask)
+
+    def tokenize_batch(self, texts: list[str]) -> list[Doc]:
+        return Tokenizer.apply_many(self.lang, texts) if len(texts) > 0 else []
+
+    def convert_docs(self, docs: list[Doc]) -> list[str]:
+        # the word mask is computed once per doc, for picking the words and for reconstructing the sentence
+        word_masks = [Reconstructor.word_mask(doc) for doc in docs]
+        words_per_doc = [self._word_tokens(doc, word_mask) for doc, word_mask in zip(docs, word_masks)]
+        # every distinct word of the batch goes through the models exactly once
+        unique_words = list(dict.fromkeys(word for words in words_per_doc for word in words))
+        word_2_grapheme = dict(zip(unique_words, self._transliterate(unique_words))) if len(unique_words) > 0 else {}
+        return Reconstructor.apply_many(docs,
+                                        [[word_2_grapheme[word] for word in words] for words in words_per_doc],
+                                        word_masks)
+
+    def batch(self, texts: list[str]) -> list[str]:
+        return self.convert_docs(self.tokenize_batch(texts))
+
+
+def warmup(languages: list[SupportedLanguage] | None = None, precision: PrecisionMode = PrecisionMode.Float32):
+    # loads every model up front, e.g. before a server starts taking requests
+    for lang in languages if languages is not None else list(SupportedLanguage):
+        Pipeline(lang, precision=precision).warmup()
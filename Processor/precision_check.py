@@ -0,0 +1,86 @@
+import argparse
+import sys
+import time
+
+import jiwer
+
+from expose_deep_phonemizer_module import expose_dp
+from Processor.DeepGraphemizer.phoneme2grapheme_converter import Phoneme2GraphemeConverter
+from Processor.DeepPhonemizer.grapheme2phoneme_converter import Grapheme2PhonemeConverter
+from Processor.Domain.precision_mode import PrecisionMode
+from Processor.Domain.supported_language import SupportedLanguage
+from Processor.PhonemeMapper.mapper import PhonemeMap
+from Processor.pipeline import G2P_MODELS_DIR, P2G_MODEL_DIR
+
+expose_dp()
+
+HeldOutWords = {
+    SupportedLanguage.Italian: [
+        "cammino", "selva", "oscura", "diritta", "smarrita", "paura", "amara", "morte",
+        "trattar", "trovai", "cose", "scorte", "ciao", "giorgio", "arrivederci", "angeli",
+        "inferno", "cantano", "piano", "chiama", "quando", "gnocchi", "sciarpa", "figlio",
+        "pizza", "zucchero", "ghiaccio", "acqua", "famiglia", "bellezza", "scienza", "luglio",
+    ],
+    SupportedLanguage.Spanish: [
+        "desocupado", "lector", "juramento", "podrás", "creer", "quisiera", "libro", "hijo",
+        "entendimiento", "hermoso", "gallardo", "discreto", "churros", "guarroces", "llamo", "gusta",
+        "cuando", "vuelves", "niño", "cigüeña", "zapato", "cerveza", "guerra", "jamón",
+        "llave", "queso", "yegua", "general", "xilófono", "hierro", "chocolate", "mañana",
+    ],
+}
+
+
+def timed(convert, inputs: list[str]) -> tuple[list[str], float]:
+    start = time.perf_counter()
+    outputs = convert(inputs)
+    return outputs, len(inputs) / (time.perf_counter() - start)
+
+
+def agreement(reference: list[str], candidate: list[str]) -> tuple[float, float]:
+    pairs = [(r, c if c is not None else "") for r, c in zip(reference, candidate) if r]
+    exact = sum(r == c for r, c in pairs) / max(len(pairs), 1)
+    cer = jiwer.cer([r for r, _ in pairs], [c for _, c in pairs]) if len(pairs) > 0 else 0.0
+    return exact, cer
+
+
+if __name__ == "__main__":
+    # Reports how often the reduced precision models agree with fp32 on a held-out word list
+    # and how much faster they are. Exits with 1 when the exact agreement drops below --min_agreement.
+    parser = argparse.ArgumentParser(description="Compares reduced precision G2P/P2G inference against fp32.")
+    parser.add_argument("--language", default=str(SupportedLanguage.Italian),
+                        choices=[str(lang) for lang in SupportedLanguage])
+    parser.add_argument("--words", default=None,
+                        help="File with one word per line (defaults to a built-in held-out sample)")
+    parser.add_argument("--precisions", nargs="+", default=[str(PrecisionMode.DynamicInt8)],
+                        choices=[str(mode) for mode in PrecisionMode if mode != PrecisionMode.Float32])
+    parser.add_argument("--min_agreement", type=float, default=0.95)
+    args = parser.parse_args()
+
+    lang = SupportedLanguage(args.language)
+    if args.words is not None:
+        with open(args.words, "r", encoding="utf-8") as f:
+            words = [line.strip() for line in f if line.strip()]
+    else:
+        words = HeldOutWords[lang]
+
+    reference_phonemes, g2p_speed = timed(Grapheme2PhonemeConverter(lang, G2P_MODELS_DIR), words)
+    # P2G is measured on the exact input it gets in the pipeline, derived from the fp32 phonemes
+    ro_phonemes = PhonemeMap.apply(lang, reference_phonemes)
+    reference_graphemes, p2g_speed = timed(Phoneme2GraphemeConverter(P2G_MODEL_DIR), ro_phonemes)
+    print(f"[{PrecisionMode.Float32}] G2P {g2p_speed:.1f} words/s, P2G {p2g_speed:.1f} words/s")
+
+    failed = False
+    for precision in [PrecisionMode(mode) for mode in args.precisions]:
+        phonemes, speed = timed(Grapheme2PhonemeConverter(lang, G2P_MODELS_DIR, precision=precision), words)
+        exact, cer = agreement(reference_phonemes, phonemes)
+        failed |= exact < args.min_agreement
+        print(f"[{precision}] G2P {speed:.1f} words/s ({speed / g2p_speed:.2f}x), "
+              f"phoneme agreement {exact:.2%}, phoneme CER {cer:.4f}")
+
+        graphemes, speed = timed(Phoneme2GraphemeConverter(P2G_MODEL_DIR, precision=precision), ro_phonemes)
+        exact, cer = agreement(reference_graphemes, graphemes)
+        failed |= exact < args.min_agreement
+        print(f"[{precision}] P2G {speed:.1f} words/s ({speed / p2g_speed:.2f}x), "
+              f"grapheme agreement {exact:.2%}, grapheme CER {cer:.4f}")
+
+    sys.exit(1 if failed else 0)
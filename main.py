@@ -9,13 +9,25 @@ warnings.filterwarnings("ignore",
                         message="Implicitly cleaning up <TemporaryDirectory*",
                         category=ResourceWarning)
 
+import argparse
 from expose_deep_phonemizer_module import expose_dp
 from Loader.cv_loader import Loader
-from tqdm import tqdm
+from Loader.uploader import Uploader, HubTarget, LocalDirectoryTarget
+from Processor.Domain.precision_mode import PrecisionMode
 
 expose_dp()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generates and publishes the augmented Romanian datasets.")
+    parser.add_argument("--local_dir", default=None,
+                        help="Save the datasets to this directory instead of pushing them to the Hub")
+    parser.add_argument("--upload_workers", type=int, default=4)
+    parser.add_argument("--upload_retries", type=int, default=3)
+    parser.add_argument("--precision", default=str(PrecisionMode.Float32),
+                        choices=[str(mode) for mode in PrecisionMode],
+                        help="Inference precision of the G2P and P2G models")
+    args = parser.parse_args()
+
     splits = [
                 # Low % of foreign data
                 (0, 0), (5, 5),
@@ -26,11 +38,16 @@ if __name__ == "__main__":
                 # High % of foreign data
                 (50, 0), (0, 50), (50, 50),
             ]
-    for it_split, sp_split in tqdm(splits, desc="Generating datasets..."):
+    target = LocalDirectoryTarget(args.local_dir) if args.local_dir is not None else HubTarget("victors3136")
+    # every split is a view over the same converted Italian/Spanish pools,
+    # uploads run in the background while the next splits are built
+    loader = Loader(precision=PrecisionMode(args.precision))
+    datasets = loader.load_many([(it_split / 100.0, sp_split / 100.0) for it_split, sp_split in splits], 5_000)
+    with Uploader(target, workers=args.upload_workers, retries=args.upload_retries) as uploader:
         try:
-            Loader(it_fraction=it_split/100.0, es_fraction=sp_split/100.0) \
-                .load(5_000) \
-                .push_to_hub(f"victors3136/dataset-5k-{it_split:02d}it-{sp_split:02d}sp")
+            for (it_split, sp_split), (_, dataset) in zip(splits, datasets):
+                uploader.submit(dataset, f"dataset-5k-{it_split:02d}it-{sp_split:02d}sp")
         except IndexError as ie:
             print(f"\nToo much data requested :(\n{ie}")
-            break
\ No newline at end of file
+        for name, exception in uploader.wait().items():
+            print(f"\nCould not upload {name}: {exception}")